@@ -0,0 +1,210 @@
+"""
+MILKIS ORDER HISTORY ARCHIVE
+
+Moves closed months of orderhistory out of the hot database into one SQLite file per month
+(orderhistory_YYYY_MM.db) and ATTACHes them back so history stays queryable.
+Once attached, milkdb.get_orders_between, get_orders_for_product, sales_totals and void_order
+read through the temp view orderhistory_all, which spans the hot table and every partition.
+The sales_daily rollup stays in the hot database and keeps covering archived months.
+milkdb.rebuild_sales_daily recomputes it from orderhistory_all, so attach every partition before a rebuild;
+months that are not attached drop out of the rebuilt rollup.
+
+SQLite attaches at most 10 databases by default, so attach only the months a report needs;
+archive_month detaches each partition after moving its rows unless asked to keep it attached.
+"""
+
+import glob
+import os
+import re
+import sqlite3
+from datetime import date, datetime, timezone
+from milkdb import ARCHIVE_SCHEMA_PREFIX, HISTORY_VIEW, _archive_schemas
+
+ARCHIVE_DIR = 'archive'
+_MONTH = re.compile(r'^(\d{4})-(\d{2})$')
+_FILE = re.compile(r'^orderhistory_(\d{4})_(\d{2})\.db$')
+
+
+def _parse_month(month):
+    # Accept 'YYYY-MM' or a date/datetime and return (year, month)
+    if isinstance(month, (date, datetime)):
+        return month.year, month.month
+    match = _MONTH.match(str(month))
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        raise ValueError(f"Month must look like 'YYYY-MM', got {month!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def archive_path(directory: str, month):
+    year, month = _parse_month(month)
+    return os.path.join(directory, f'orderhistory_{year:04d}_{month:02d}.db')
+
+
+def _schema(year: int, month: int):
+    return f'{ARCHIVE_SCHEMA_PREFIX}{year:04d}_{month:02d}'
+
+
+def _attach(conn, path: str, year: int, month: int):
+    # ATTACH one partition under its schema name unless it is already attached
+    schema = _schema(year, month)
+    if schema not in _archive_schemas(conn):
+        conn.execute('ATTACH DATABASE ? AS ' + schema, (path,))
+    return schema
+
+
+def _create_view(conn):
+    # (Re)create the temp view over the hot table and every attached partition
+    schemas = _archive_schemas(conn)
+    conn.execute(f'DROP VIEW IF EXISTS temp.{HISTORY_VIEW}')
+    if schemas:
+        selects = ['SELECT transaction_id, product_id, transaction_date, cost, quantity FROM main.orderhistory']
+        selects += [f'SELECT transaction_id, product_id, transaction_date, cost, quantity FROM {schema}.orderhistory'
+                    for schema in schemas]
+        conn.execute(f'CREATE TEMP VIEW {HISTORY_VIEW} AS ' + ' UNION ALL '.join(selects))
+
+
+def _on_connect(conn, name: str, hook):
+    # A ConnectionManager runs hook on every connection it opens from now on, reader() snapshots included,
+    # so reports see the same partitions as the connection that attached them
+    set_hook = getattr(conn, 'set_connect_hook', None)
+    if callable(set_hook):
+        set_hook(name, hook)
+
+
+def _attach_limit(conn):
+    # Most databases conn can have attached at once (SQLITE_LIMIT_ATTACHED, 10 unless SQLite was built otherwise)
+    getlimit = getattr(conn, 'getlimit', None)
+    return getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if callable(getlimit) else 10
+
+
+def _attached(conn):
+    return [row[1] for row in conn.execute('PRAGMA database_list') if row[1] not in ('main', 'temp')]
+
+
+def archive_month(conn, month, directory: str = ARCHIVE_DIR, keep_attached: bool = False):
+    # Moves every orderhistory row of a closed month into its own partition file
+    # the partition is detached again afterwards, so a backfill can archive any number of months, unless
+    # keep_attached is set: then it stays attached, on every connection a ConnectionManager opens as well
+    # rerunning for the same month is safe: rows already copied are skipped, not duplicated
+    year, month_number = _parse_month(month)
+    today = datetime.now(timezone.utc).date()
+    if (year, month_number) >= (today.year, today.month):
+        return {"message": f"Month {year:04d}-{month_number:02d} is not closed yet"}
+
+    start = f'{year:04d}-{month_number:02d}-01'
+    end = f'{year + month_number // 12:04d}-{month_number % 12 + 1:02d}-01'
+    schema = _schema(year, month_number)
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        if conn.in_transaction:
+            conn.commit()  # ATTACH is not allowed inside a transaction
+        path = archive_path(directory, f'{year:04d}-{month_number:02d}')
+        was_attached = schema in _archive_schemas(conn)
+        _attach(conn, path, year, month_number)
+
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {schema}.orderhistory (
+                transaction_id INTEGER PRIMARY KEY,
+                product_id INTEGER,
+                transaction_date TIMESTAMP,
+                cost REAL NOT NULL,
+                quantity INTEGER NOT NULL
+            )''')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {schema}.idx_orderhistory_product_date '
+                       f'ON orderhistory (product_id, transaction_date)')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {schema}.idx_orderhistory_date ON orderhistory (transaction_date)')
+
+        # A transaction over two files is not atomic in WAL mode, so copy first and commit the partition.
+        # A crash after this commit leaves the rows in both files, and rerunning removes them from main
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO {schema}.orderhistory (transaction_id, product_id, transaction_date, cost, quantity)
+            SELECT transaction_id, product_id, transaction_date, cost, quantity
+            FROM main.orderhistory
+            WHERE transaction_date >= ? AND transaction_date < ?''', (start, end))
+        conn.commit()
+
+        # Then delete from main only the rows the partition now holds.
+        # Moving rows is not voiding them: note what the delete trigger takes out of sales_daily and put it back
+        moved = (f'transaction_date >= ? AND transaction_date < ? '
+                 f'AND transaction_id IN (SELECT transaction_id FROM {schema}.orderhistory)')
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(f'''
+            SELECT product_id, date(transaction_date), COUNT(*), SUM(quantity), SUM(cost)
+            FROM main.orderhistory
+            WHERE {moved} AND product_id IS NOT NULL
+            GROUP BY product_id, date(transaction_date)''', (start, end))
+        rollup = cursor.fetchall()
+        cursor.execute(f'DELETE FROM main.orderhistory WHERE {moved}', (start, end))
+        archived = cursor.rowcount
+        cursor.executemany('''
+            INSERT INTO sales_daily (product_id, day, orders, units, revenue) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (product_id, day) DO UPDATE SET
+                orders = orders + excluded.orders,
+                units = units + excluded.units,
+                revenue = revenue + excluded.revenue''', rollup)
+        conn.commit()
+
+        if keep_attached:
+            def attach_partition(connection):
+                _attach(connection, path, year, month_number)
+                _create_view(connection)
+            _on_connect(conn, schema, attach_partition)
+        elif not was_attached:
+            conn.execute('DETACH DATABASE ' + schema)
+        _create_view(conn)
+        return {"message": f"Archived {archived} order(s) from {year:04d}-{month_number:02d}", "archived": archived}
+
+    except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.rollback()
+        return {"message": f"Error: {e}"}
+
+
+def attach_archives(conn, directory: str = ARCHIVE_DIR, since=None, until=None):
+    # Attaches the partition files in directory for since <= month <= until (all of them by default)
+    # and creates the orderhistory_all view; a ConnectionManager repeats this on every new connection
+    # returns the attached partitions, or an error dict if they do not fit under SQLite's attach limit
+    bounds = (_parse_month(since) if since is not None else (0, 0),
+              _parse_month(until) if until is not None else (9999, 12))
+    partitions = []
+    for path in sorted(glob.glob(os.path.join(directory, 'orderhistory_*_*.db'))):
+        match = _FILE.match(os.path.basename(path))
+        if match:
+            year, month = int(match.group(1)), int(match.group(2))
+            if bounds[0] <= (year, month) <= bounds[1]:
+                partitions.append((path, year, month))
+
+    attached = _attached(conn)
+    wanted = len(set(attached) | {_schema(year, month) for _, year, month in partitions})
+    if wanted > _attach_limit(conn):
+        return {"message": f"Error: {len(partitions)} partition(s) would make {wanted} attached databases, "
+                           f"over SQLite's limit of {_attach_limit(conn)}; narrow since/until"}
+
+    def attach_all(connection):
+        for path, year, month in partitions:
+            _attach(connection, path, year, month)
+        _create_view(connection)
+
+    try:
+        attach_all(conn)
+    except sqlite3.Error as e:
+        # Leave the connection as it was, and install no hook that would fail on every new connection
+        for schema in _archive_schemas(conn):
+            if schema not in attached:
+                conn.execute('DETACH DATABASE ' + schema)
+        _create_view(conn)
+        return {"message": f"Error: {e}"}
+    _on_connect(conn, 'archives', attach_all)
+    return _archive_schemas(conn)
+
+
+def detach_archives(conn):
+    # Detaches every partition and drops the orderhistory_all view
+    _on_connect(conn, 'archives', None)
+    conn.execute(f'DROP VIEW IF EXISTS temp.{HISTORY_VIEW}')
+    for schema in _archive_schemas(conn):
+        _on_connect(conn, schema, None)  # the hook archive_month left, if any
+        conn.execute('DETACH DATABASE ' + schema)
@@ -0,0 +1,219 @@
+"""
+MILKIS ASYNCIO API
+
+Async counterparts of the milkdb functions and of VendingMachine.
+SQLite work runs on a dedicated, bounded thread pool so the event loop never blocks on I/O,
+and identical read requests that are in flight at the same time share one query.
+"""
+
+import asyncio
+import copy
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import milkdb
+from dbpool import ConnectionManager
+from slotgrid import DEFAULT_GRID
+from vendingapi import VendingMachine
+
+
+class AsyncMilkDB:
+    def __init__(self, conn, max_workers: int = 4, max_pending: int = 1024):
+        """
+        Args:
+            conn: A dbpool.ConnectionManager or a database path to open one for.
+                Each worker thread uses its own pooled connection.
+            max_workers (int): Threads running SQLite work.
+            max_pending (int): Most calls queued or running at once; further callers wait without blocking the loop.
+        """
+        self.conn = ConnectionManager(conn) if isinstance(conn, str) else conn
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="milkdb")
+        self._max_pending = max_pending
+        self._slots = {}  # event loop -> semaphore bounding pending calls
+        self._inflight = {}  # (event loop, generation, function name, args) -> [task shared by coalesced reads, callers]
+        self._generation = 0  # bumped by every write, so reads only coalesce with reads started after it
+        self.coalesced = 0
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the SQLite thread pool and return its result.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._slots.get(loop)
+        if semaphore is None:
+            semaphore = self._slots[loop] = asyncio.Semaphore(self._max_pending)
+        async with semaphore:
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def _read(self, fn, *args):
+        # Identical reads in flight at the same time, and started since the last write, share one query.
+        # The query runs in its own task, so a cancelled caller does not cancel it for the others,
+        # and callers that shared it each get their own copy of the result to mutate
+        loop = asyncio.get_running_loop()
+        key = (loop, self._generation, fn.__name__, args)
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = loop.create_task(self.run(fn, self.conn, *args))
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(functools.partial(self._finish_read, key))
+        else:
+            self.coalesced += 1
+        entry[1] += 1
+        result = await asyncio.shield(entry[0])
+        return copy.deepcopy(result) if entry[1] > 1 else result
+
+    async def _write(self, fn, *args):
+        # A read already in flight may not see this write, so later reads must not join it
+        self._generation += 1
+        return await self.run(fn, *args)
+
+    def _finish_read(self, key, task):
+        del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here so a failure nobody awaits any more is not logged as unhandled
+
+    async def _iterate(self, page, limit: int = None):
+        # Yield rows from page(after_id), which reads one keyset page on the thread pool.
+        # Every page is a separate call, so no cursor is shared between worker threads
+        after_id = 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            rows = await self.run(page, after_id)
+            if not rows:
+                return
+            if remaining is not None:
+                rows = rows[:remaining]
+                remaining -= len(rows)
+            for row in rows:
+                yield row
+            after_id = rows[-1][0]
+
+    async def close(self):
+        """
+        Wait for queued work to finish, then stop the thread pool and close its connections.
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        self.conn.close()
+
+    ###INVENTORY TABLE OPERATIONS###
+    async def create_product(self, product):
+        return await self._write(milkdb.create_product, product, self.conn)
+
+    async def get_products(self):
+        return await self._read(milkdb.get_products)
+
+    def iter_products(self, batch_size: int = 500, as_view: bool = False):
+        return self._iterate(lambda after_id: list(itertools.islice(
+            milkdb.iter_products(self.conn, batch_size, after_id, as_view), batch_size)))
+
+    async def get_product(self, product_id: int):
+        return await self._read(milkdb.get_product, product_id)
+
+    async def search_products(self, query: str, limit: int = milkdb.SEARCH_LIMIT):
+        return await self._read(milkdb.search_products, query, limit)
+
+    async def update_product(self, product_id: int, product):
+        return await self._write(milkdb.update_product, self.conn, product_id, product)
+
+    async def add_quantity(self, item_name: str, quantity_to_add: int = 1):
+        return await self._write(milkdb.add_quantity, self.conn, item_name, quantity_to_add)
+
+    async def delete_productID(self, product_id: int):
+        return await self._write(milkdb.delete_productID, product_id, self.conn)
+
+    async def delete_productname(self, product_name: str):
+        return await self._write(milkdb.delete_productname, product_name, self.conn)
+
+    async def display_inventory_table(self):
+        return await self._read(milkdb.display_inventory_table)
+
+    async def stream_inventory_table(self, out, fmt: str = "text"):
+        return await self.run(milkdb.stream_inventory_table, self.conn, out, fmt)
+
+    ###TRANSACTION TABLE OPERATIONS###
+    async def order_many(self, lines, writer=None):
+        return await self._write(milkdb.order_many, self.conn, lines, writer)
+
+    async def order(self, product_id: int, qty: int, writer=None):
+        return await self._write(milkdb.order, self.conn, product_id, qty, writer)
+
+    async def vend(self, product_id: int, qty: int = 1):
+        return await self._write(milkdb.vend, self.conn, product_id, qty)
+
+    async def void_order(self, transaction_id: int):
+        return await self._write(milkdb.void_order, self.conn, transaction_id)
+
+    async def display_transaction_table(self):
+        return await self._read(milkdb.display_transaction_table)
+
+    async def stream_transaction_table(self, out, fmt: str = "text"):
+        return await self.run(milkdb.stream_transaction_table, self.conn, out, fmt)
+
+    def iter_transactions(self, after_id: int = 0, limit: int = None, batch_size: int = 500):
+        return self._iterate(lambda last_id: list(milkdb.iter_transactions(
+            self.conn, max(after_id, last_id), batch_size, batch_size)), limit)
+
+    async def get_orders_between(self, start, end):
+        return await self._read(milkdb.get_orders_between, start, end)
+
+    async def get_orders_for_product(self, product_id: int, since=None):
+        return await self._read(milkdb.get_orders_for_product, product_id, since)
+
+    async def sales_totals(self, start, end):
+        return await self._read(milkdb.sales_totals, start, end)
+
+    async def get_daily_sales(self, start, end, product_id: int = None):
+        return await self._read(milkdb.get_daily_sales, start, end, product_id)
+
+    ###LOW STOCK###
+    async def set_reorder_threshold(self, product_id: int, threshold: int = None, restock_level: int = None):
+        return await self._write(milkdb.set_reorder_threshold, self.conn, product_id, threshold, restock_level)
+
+    async def get_most_depleted(self, limit: int = 10):
+        return await self._read(milkdb.get_most_depleted, limit)
+
+    async def get_low_stock(self):
+        return await self._read(milkdb.get_low_stock)
+
+    ###BULK PRICING###
+    async def reprice(self, where: dict = None, pct: float = 0, round_to: float = None):
+        return await self._write(milkdb.reprice, self.conn, where, pct, round_to)
+
+    async def inventory_valuation(self, group_by: str = 'product_company'):
+        return await self._read(milkdb.inventory_valuation, group_by)
+
+
+class AsyncVendingMachine:
+    def __init__(self, db: AsyncMilkDB, grid=DEFAULT_GRID):
+        """
+        A VendingMachine whose database work runs on db's thread pool.
+
+        Args:
+            db (AsyncMilkDB): Supplies the pooled connection and the thread pool.
+            grid (SlotGrid): The machine's slot layout.
+        """
+        self.db = db
+        self.machine = VendingMachine(connection=db.conn, grid=grid)
+        # Slot changes run one at a time: load_planogram swaps in a new slot array, which would drop a change
+        # made to the old one meanwhile, and journal records must not interleave
+        self._lock = asyncio.Lock()
+
+    async def load_into(self, slot_name: str, product_identifier: str):
+        async with self._lock:
+            return await self.db.run(self.machine.load_into, slot_name, product_identifier)
+
+    async def load_planogram(self, planogram: dict):
+        async with self._lock:
+            return await self.db.run(self.machine.load_planogram, planogram)
+
+    # Slots live in memory, so these answer straight away without a thread hop
+
+    async def remove_from(self, slot_name: str):
+        async with self._lock:
+            return self.machine.remove_from(slot_name)
+
+    async def get_product(self, slot_name: str):
+        return self.machine.get_product(slot_name)
+
+    async def list_products(self):
+        return self.machine.list_products()
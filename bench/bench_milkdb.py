@@ -0,0 +1,172 @@
+"""
+MILKIS BENCHMARKS
+
+Times the milkdb and VendingMachine hot paths against temporary SQLite files seeded
+with 1k, 100k and 1M inventory rows, and writes the results as JSON.
+
+    python bench/bench_milkdb.py                              # all sizes, writes bench_results.json
+    python bench/bench_milkdb.py --sizes 1000 --ops get_product add_quantity
+    python bench/bench_milkdb.py --output new.json --compare bench_results.json
+
+With --compare, every operation that got slower than --threshold times the old run is reported
+and the exit status is 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import milkdb  # noqa: E402
+from model import Product  # noqa: E402
+from vendingapi import VendingMachine  # noqa: E402
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+SLOTS = ["a1", "a2", "a3", "b1", "b2", "b3", "c1", "c2", "c3"]
+SEED_BATCH = 10000
+
+
+def seed(conn, size: int):
+    # Fill inventory with size rows and a matching number of orderhistory rows, untimed
+    for start in range(0, size, SEED_BATCH):
+        stop = min(start + SEED_BATCH, size)
+        conn.executemany('INSERT INTO inventory (product_name, price, product_company, quantity) VALUES (?, ?, ?, ?)',
+                         ((f"product-{i}", round(0.5 + (i % 400) / 100, 2), f"company-{i % 50}", i % 30)
+                          for i in range(start, stop)))
+        conn.executemany('INSERT INTO orderhistory (product_id, cost, quantity) VALUES (?, ?, ?)',
+                         ((i + 1, 1.0, 1) for i in range(start, stop)))
+        conn.commit()
+
+
+def timed(fn, calls: int):
+    # Run fn(i) calls times, returning per-call latencies in seconds
+    samples = []
+    for i in range(calls):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_size(size: int, calls: int, ops, rng):
+    # Benchmark every selected operation against a fresh database of the given size
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_file = os.path.join(tmpdir, 'bench.db')
+        conn = milkdb.setUpDB(sqlite3.connect(db_file))
+        seed(conn, size)
+
+        ids = [rng.randint(1, size) for _ in range(calls)]
+        names = [f"product-{product_id - 1}" for product_id in ids]
+        new_products = [Product(product_name=f"new-{i}", price=1.25, quantity=1) for i in range(calls)]
+        machine = VendingMachine(connection=conn)
+        for slot_name, name in zip(SLOTS, names):
+            machine.load_into(slot_name, name)
+
+        cases = {
+            "create_product": (calls, lambda i: milkdb.create_product(new_products[i], conn)),
+            "get_products": (1, lambda i: milkdb.get_products(conn)),
+            "get_product": (calls, lambda i: milkdb.get_product(conn, ids[i])),
+            "add_quantity": (calls, lambda i: milkdb.add_quantity(conn, names[i], 1)),
+            "order": (calls, lambda i: milkdb.order(conn, ids[i], 1)),
+            "order_many": (1, lambda i: milkdb.order_many(conn, [(product_id, 1) for product_id in ids])),
+            "display_inventory_table": (1, lambda i: milkdb.display_inventory_table(conn)),
+            "vending_load_into": (calls, lambda i: machine.load_into(SLOTS[i % len(SLOTS)], names[i])),
+            "vending_get_product": (calls, lambda i: machine.get_product(SLOTS[i % len(SLOTS)])),
+        }
+
+        results = []
+        for op, (op_calls, fn) in cases.items():
+            if ops and op not in ops:
+                continue
+            samples = timed(fn, op_calls)
+            results.append(summarize(size, op, samples))
+            print(f"{size:>9} rows  {op:<24} {results[-1]['per_call_us']:>14.1f} us/call", file=sys.stderr)
+
+        conn.close()
+        return results
+
+
+def summarize(size: int, op: str, samples):
+    ordered = sorted(samples)
+    total = sum(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1e6
+
+    return {
+        "size": size,
+        "op": op,
+        "calls": len(samples),
+        "total_s": total,
+        "per_call_us": total / len(samples) * 1e6,
+        "p50_us": statistics.median(ordered) * 1e6,
+        "p95_us": percentile(0.95),
+        "p99_us": percentile(0.99),
+    }
+
+
+def compare(new, old, threshold: float):
+    # Print old vs new per-call time for matching (size, op) pairs and return the regressions
+    old_results = {(row["size"], row["op"]): row for row in old["results"]}
+    regressions = []
+    for row in new["results"]:
+        before = old_results.get((row["size"], row["op"]))
+        if before is None:
+            continue
+        ratio = row["per_call_us"] / before["per_call_us"] if before["per_call_us"] else float("inf")
+        flag = "REGRESSION" if ratio > threshold else ""
+        print(f"{row['size']:>9} rows  {row['op']:<24} {before['per_call_us']:>12.1f} -> "
+              f"{row['per_call_us']:>12.1f} us  x{ratio:.2f} {flag}")
+        if ratio > threshold:
+            regressions.append(row)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark milkdb and VendingMachine hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="inventory rows to seed")
+    parser.add_argument("--calls", type=int, default=1000, help="calls per per-item operation")
+    parser.add_argument("--ops", nargs="+", help="only run these operations")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the ids looked up")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "calls": args.calls,
+            "seed": args.seed,
+        },
+        "results": [],
+    }
+    for size in args.sizes:
+        report["results"].extend(bench_size(size, min(args.calls, size), args.ops, rng))
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if compare(report, old, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+MILKIS LOAD GENERATOR
+
+Finds how many concurrent machines one milkdb database sustains. For every concurrency level,
+that many client processes each drive a simulated VendingMachine against a shared SQLite file
+for --duration seconds, issuing a weighted mix of:
+  load     VendingMachine.load_into (product lookup by name)
+  lookup   milkdb.get_product
+  vend     milkdb.vend
+  restock  milkdb.order
+and the results are reported per level: throughput, latency percentiles, lock-wait time and error rates.
+
+    python bench/loadgen.py                                   # 1, 2, 4, 8, 16 clients, 5 s each
+    python bench/loadgen.py --concurrency 1 4 16 64 --duration 10 --mix vend=80,lookup=20
+    python bench/loadgen.py --db milkis.db --output loadgen_results.json
+
+Lock wait is the time spent acquiring SQLite's write lock: from the start of each BEGIN IMMEDIATE,
+or of the first write after an implicit BEGIN, to the start of the next statement, including vend's
+busy retries. It is measured with a trace callback, so it also counts the few microseconds the write
+itself takes.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import instrumentation  # noqa: E402
+import milkdb  # noqa: E402
+from dbpool import ConnectionManager  # noqa: E402
+from slotgrid import DEFAULT_GRID  # noqa: E402
+from vendingapi import VendingMachine  # noqa: E402
+
+DEFAULT_CONCURRENCY = [1, 2, 4, 8, 16]
+DEFAULT_MIX = "load=5,lookup=55,vend=35,restock=5"
+OPERATIONS = ("load", "lookup", "vend", "restock")
+SEED_BATCH = 10000
+
+
+def parse_mix(text: str):
+    # "vend=80,lookup=20" -> {"vend": 80.0, "lookup": 20.0}
+    mix = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        op = op.strip()
+        if op not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {op!r}; choose from {', '.join(OPERATIONS)}")
+        try:
+            mix[op] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Weight for {op!r} must be a number") from None
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("At least one operation needs a positive weight")
+    return mix
+
+
+def seed(db_file: str, products: int, stock: int):
+    # Create the schema and products product-0 ... product-N with stock units each, untimed
+    conn = milkdb.setUpDB(sqlite3.connect(db_file))
+    conn.execute('PRAGMA journal_mode = WAL')
+    existing = conn.execute('SELECT COUNT(*) FROM inventory').fetchone()[0]
+    for start in range(existing, products, SEED_BATCH):
+        stop = min(start + SEED_BATCH, products)
+        conn.executemany('INSERT INTO inventory (product_name, price, product_company, quantity) VALUES (?, ?, ?, ?)',
+                         ((f"product-{i}", round(0.5 + (i % 400) / 100, 2), f"company-{i % 50}", stock)
+                          for i in range(start, stop)))
+        conn.commit()
+    conn.close()
+
+
+class LockWaitTracer:
+    # Trace callback adding up the time each write-lock acquisition takes (see the module docstring)
+    def __init__(self):
+        self.total = 0.0
+        self._started = None  # perf_counter at the start of a lock-acquiring statement
+        self._deferred = False  # an implicit BEGIN ran and no write has taken the lock yet
+
+    def __call__(self, statement: str):
+        now = time.perf_counter()
+        self.finish(now)
+        keyword = statement.lstrip()[:16].upper()
+        if keyword.startswith("BEGIN IMMEDIATE"):
+            self._started = now
+        elif keyword.startswith("BEGIN"):
+            self._deferred = True
+        elif self._deferred and keyword.startswith(("INSERT", "UPDATE", "DELETE", "REPLACE")):
+            self._started = now
+            self._deferred = False
+        elif keyword.startswith(("COMMIT", "ROLLBACK", "END")):
+            self._deferred = False
+
+    def finish(self, now: float):
+        if self._started is not None:
+            self.total += now - self._started
+            self._started = None
+
+
+def client(db_file: str, mix: dict, products: int, duration: float, seed_value: int, barrier, results):
+    # One simulated machine: runs the mix until duration has passed and reports what it saw
+    rng = random.Random(seed_value)
+    conn = ConnectionManager(db_file)
+    tracer = LockWaitTracer()
+    instrumentation.set_trace_callback(conn, tracer)  # keeps working with MILKIS_INSTRUMENT=1
+    machine = VendingMachine(connection=conn)
+    slots = DEFAULT_GRID.codes
+
+    operations = {
+        "load": lambda product_id: machine.load_into(rng.choice(slots), f"product-{product_id - 1}"),
+        "lookup": lambda product_id: milkdb.get_product(conn, product_id),
+        "vend": lambda product_id: milkdb.vend(conn, product_id, 1),
+        "restock": lambda product_id: milkdb.order(conn, product_id, rng.randint(1, 20)),
+    }
+    names = [op for op in mix if mix[op] > 0]
+    weights = [mix[op] for op in names]
+    latencies = {op: [] for op in names}
+    errors = {op: 0 for op in names}
+    out_of_stock = 0
+    error_samples = []
+
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    while True:
+        start = time.perf_counter()
+        if start >= deadline:
+            break
+        op = rng.choices(names, weights)[0]
+        try:
+            result = operations[op](rng.randint(1, products))
+            failed = isinstance(result, dict) and result.get("message", "").startswith("Error")
+            if isinstance(result, dict) and result.get("message") == "Insufficient stock":
+                out_of_stock += 1
+        except sqlite3.Error as e:
+            result = {"message": f"Error: {e}"}
+            failed = True
+            if conn.in_transaction:
+                conn.rollback()
+        end = time.perf_counter()
+        tracer.finish(end)
+        latencies[op].append(end - start)
+        if failed:
+            errors[op] += 1
+            if len(error_samples) < 5:
+                error_samples.append(result["message"])
+
+    instrumentation.set_trace_callback(conn, None)
+    conn.close()
+    results.put({"latencies": latencies, "errors": errors, "out_of_stock": out_of_stock,
+                 "lock_wait_s": tracer.total, "error_samples": error_samples})
+
+
+def percentile(ordered, p: float):
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1e6 if ordered else 0.0
+
+
+def run_level(db_file: str, concurrency: int, mix: dict, products: int, duration: float, seed_value: int):
+    # Start concurrency client processes together and merge their reports
+    context = multiprocessing.get_context()
+    barrier = context.Barrier(concurrency)
+    results = context.Queue()
+    processes = [context.Process(target=client, args=(db_file, mix, products, duration,
+                                                      seed_value * 1000 + i, barrier, results))
+                 for i in range(concurrency)]
+    for process in processes:
+        process.start()
+
+    reports = []
+    try:
+        for _ in processes:
+            reports.append(results.get(timeout=duration + 60))
+    except queue.Empty:
+        print(f"  {concurrency} clients: only {len(reports)} reported back", file=sys.stderr)
+    for process in processes:
+        process.join()
+
+    by_op = {}
+    for report in reports:
+        for op, samples in report["latencies"].items():
+            by_op.setdefault(op, {"samples": [], "errors": 0})
+            by_op[op]["samples"].extend(samples)
+            by_op[op]["errors"] += report["errors"][op]
+
+    all_samples = sorted(sample for op in by_op.values() for sample in op["samples"])
+    total_ops = len(all_samples)
+    total_errors = sum(op["errors"] for op in by_op.values())
+    lock_wait = sum(report["lock_wait_s"] for report in reports)
+    writes = sum(len(by_op.get(op, {"samples": []})["samples"]) for op in ("vend", "restock"))
+    return {
+        "concurrency": concurrency,
+        "clients_reported": len(reports),
+        "ops": total_ops,
+        "throughput_ops_s": total_ops / duration,
+        "p50_us": percentile(all_samples, 0.50),
+        "p95_us": percentile(all_samples, 0.95),
+        "p99_us": percentile(all_samples, 0.99),
+        "lock_wait_s": lock_wait,
+        "lock_wait_per_write_us": lock_wait / writes * 1e6 if writes else 0.0,
+        "lock_wait_share": lock_wait / (duration * len(reports)) if reports else 0.0,
+        "errors": total_errors,
+        "error_rate": total_errors / total_ops if total_ops else 0.0,
+        "out_of_stock": sum(report["out_of_stock"] for report in reports),
+        "error_samples": sorted({message for report in reports for message in report["error_samples"]})[:5],
+        "operations": {
+            op: {
+                "ops": len(values["samples"]),
+                "errors": values["errors"],
+                "p50_us": percentile(sorted(values["samples"]), 0.50),
+                "p99_us": percentile(sorted(values["samples"]), 0.99),
+            }
+            for op, values in by_op.items()
+        },
+    }
+
+
+def print_level(row):
+    print(f"{row['concurrency']:>5} {row['throughput_ops_s']:>12.0f} {row['p50_us']:>10.0f} {row['p95_us']:>10.0f} "
+          f"{row['p99_us']:>11.0f} {row['lock_wait_per_write_us']:>14.0f} {row['lock_wait_share']:>9.1%} "
+          f"{row['error_rate']:>8.2%}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent vending machines against one milkdb database")
+    parser.add_argument("--db", help="database file to use (default: a seeded temporary file)")
+    parser.add_argument("--products", type=int, default=1000, help="products to seed and pick from")
+    parser.add_argument("--stock", type=int, default=100000, help="starting quantity of every seeded product")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY,
+                        help="client process counts to test")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to run each concurrency level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the client operation streams")
+    parser.add_argument("--output", default="loadgen_results.json", help="where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_file = args.db or os.path.join(tmpdir, "loadgen.db")
+        seed(db_file, args.products, args.stock)
+
+        print(f"{'procs':>5} {'ops/s':>12} {'p50 us':>10} {'p95 us':>10} {'p99 us':>11} "
+              f"{'lock us/write':>14} {'lock %':>9} {'errors':>8}")
+        levels = []
+        for concurrency in args.concurrency:
+            levels.append(run_level(db_file, concurrency, args.mix, args.products, args.duration, args.seed))
+            print_level(levels[-1])
+
+    knee = max(levels, key=lambda row: row["throughput_ops_s"])["concurrency"] if levels else None
+    print(f"Peak throughput at {knee} client(s)")
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "products": args.products,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "seed": args.seed,
+        },
+        "peak_concurrency": knee,
+        "levels": levels,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+MILKIS CATALOGUE IMPORT / EXPORT
+
+Bulk load supplier catalogues into the inventory table and stream it back out, as CSV or JSON Lines.
+Imports validate every record, then upsert on product_name with executemany, one transaction per chunk.
+An existing product only has the columns its record supplies overwritten, so a price list leaves stock alone.
+"""
+
+import csv
+import itertools
+import json
+import os
+from pydantic import ValidationError
+from model import Product
+from milkdb import iter_products
+
+IMPORT_CHUNK_SIZE = 5000
+EXPORT_FIELDS = ["id", "product_name", "price", "product_company", "quantity"]
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+UPDATE_COLUMNS = ("price", "product_company", "quantity")
+
+
+def _upsert_sql(columns):
+    # New products are inserted whole, with Product defaults for what the record left out;
+    # existing ones only get the columns the record supplied
+    if not columns:
+        conflict = 'DO NOTHING'
+    else:
+        conflict = 'DO UPDATE SET\n        ' + ',\n        '.join(f'{column} = excluded.{column}' for column in columns)
+    return f'''
+    INSERT INTO inventory (product_name, price, product_company, quantity)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(product_name) {conflict}
+'''
+
+
+UPSERT_SQL = _upsert_sql(UPDATE_COLUMNS)
+
+
+def _format(path: str, fmt: str = None):
+    # Work out the file format from fmt or the file extension
+    fmt = fmt or FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError(f"Unknown catalogue format for {path!r}; use .csv or .jsonl, or pass fmt")
+    return fmt
+
+
+def _read_records(f, fmt: str):
+    # Yields (line number, record dict); JSON that does not parse is yielded as its error message
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        for record in reader:
+            # Empty optional columns count as missing: Product defaults for a new product, kept for an existing one
+            yield reader.line_num, {key: value for key, value in record.items() if value not in ("", None)}
+    else:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_num, f"Invalid JSON: {e}"
+                continue
+            if isinstance(record, dict):
+                # null counts as missing, like an empty CSV cell; exports write NULL companies as null
+                record = {key: value for key, value in record.items() if value is not None}
+            yield line_num, record
+
+
+def import_products(conn, path: str, fmt: str = None, chunk_size: int = IMPORT_CHUNK_SIZE):
+    # Upserts every valid record in a CSV or JSONL catalogue, keyed on product_name
+    # invalid records are skipped and reported by line number; each chunk of valid rows is one transaction
+    fmt = _format(path, fmt)
+    imported = 0
+    errors = []
+    batch = []  # (supplied update columns, row)
+
+    def write(records):
+        try:
+            # One executemany per run of records supplying the same columns, keeping the file order
+            for columns, run in itertools.groupby(records, key=lambda item: item[0]):
+                sql = UPSERT_SQL if columns == UPDATE_COLUMNS else _upsert_sql(columns)
+                conn.executemany(sql, [row for _, row in run])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    with open(path, newline="", encoding="utf-8") as f:
+        for line_num, record in _read_records(f, fmt):
+            if isinstance(record, str):
+                errors.append((line_num, record))
+                continue
+            try:
+                product = Product(**record)
+            except (ValidationError, TypeError) as e:
+                errors.append((line_num, str(e)))
+                continue
+
+            columns = tuple(column for column in UPDATE_COLUMNS if column in record)
+            batch.append((columns, (product.product_name, product.price, product.product_company, product.quantity)))
+            if len(batch) >= chunk_size:
+                write(batch)
+                imported += len(batch)
+                batch = []
+
+    if batch:
+        write(batch)
+        imported += len(batch)
+
+    return {"message": f"Imported {imported} product(s)", "imported": imported, "errors": errors}
+
+
+def export_products(conn, path: str, fmt: str = None, batch_size: int = IMPORT_CHUNK_SIZE):
+    # Streams the inventory table to a CSV or JSONL file, one keyset page at a time
+    fmt = _format(path, fmt)
+    exported = 0
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_FIELDS)
+            for row in iter_products(conn, batch_size):
+                writer.writerow(row)
+                exported += 1
+        else:
+            for row in iter_products(conn, batch_size):
+                f.write(json.dumps(dict(zip(EXPORT_FIELDS, row))))
+                f.write("\n")
+                exported += 1
+
+    return {"message": f"Exported {exported} product(s)", "exported": exported}
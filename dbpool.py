@@ -0,0 +1,227 @@
+"""
+MILKIS CONNECTION MANAGER
+
+Hands out one pooled sqlite3 connection per thread, tuned with pragmas on open,
+and closes it when its thread exits.
+A ConnectionManager can be passed anywhere milkdb or VendingMachine expects a connection.
+reader() adds a second, read-only connection per thread for reports, pinned to one WAL snapshot.
+"""
+
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from urllib.parse import quote
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64000,  # negative means KiB, so roughly 64MB of page cache
+    "busy_timeout": 5000,
+}
+# Pragmas that cannot or need not be set on a read-only connection; WAL mode is a property of the file
+WRITER_ONLY_PRAGMAS = ("journal_mode", "synchronous")
+
+
+class _ThreadConnections:
+    # Lives in the manager's thread-local storage only. CPython drops it as soon as its thread exits,
+    # which runs the finalizers closing that thread's connections
+    __slots__ = ("finalizers", "__weakref__")
+
+    def __init__(self):
+        self.finalizers = {}  # id(connection) -> weakref.finalize
+
+
+def _close_connection(manager_ref, conn):
+    manager = manager_ref()
+    if manager is not None:
+        manager._forget(conn)
+    conn.close()
+
+
+class ConnectionManager:
+    def __init__(self, db_file: str, pragmas: dict = None, **connect_kwargs):
+        """
+        Create a manager for the database file.
+
+        Args:
+            db_file (str): Path of the SQLite database file.
+            pragmas (dict): Pragmas applied to every new connection, merged over DEFAULT_PRAGMAS.
+                Pass a value of None to leave that pragma at the SQLite default.
+            **connect_kwargs: Extra keyword arguments for sqlite3.connect.
+        """
+        self.db_file = db_file
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        self.pragmas.update(pragmas or {})
+        self.connect_kwargs = connect_kwargs
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._connect_hooks = {}
+        self._hooks_version = 0  # bumped by set_connect_hook so reader() reopens with the current hooks
+
+    def connection(self):
+        """
+        Get the connection owned by the calling thread, opening it on first use.
+
+        Returns:
+            sqlite3.Connection: The thread's pooled connection.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    def _close_on_thread_exit(self, conn):
+        # Executors recycle threads, so a connection must not outlive the thread that owns it
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            holder = self._local.holder = _ThreadConnections()
+        holder.finalizers[id(conn)] = weakref.finalize(holder, _close_connection, weakref.ref(self), conn)
+
+    def _close_own(self, conn):
+        # Close one of the calling thread's connections now rather than at thread exit
+        holder = getattr(self._local, "holder", None)
+        finalizer = holder.finalizers.pop(id(conn), None) if holder is not None else None
+        if finalizer is not None:
+            finalizer()
+        else:
+            _close_connection(weakref.ref(self), conn)
+
+    def _forget(self, conn):
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+
+    def _open(self, read_only: bool = False):
+        # Connections are closed by close() from whichever thread calls it,
+        # so the same-thread check is relaxed; each one is still only used by its owner
+        kwargs = {"check_same_thread": False}
+        kwargs.update(self.connect_kwargs)
+        if read_only:
+            # Autocommit, so reader() alone decides where the read transaction starts and ends
+            kwargs.update(uri=True, isolation_level=None)
+            conn = sqlite3.connect(f"file:{quote(self.db_file)}?mode=ro", **kwargs)
+        else:
+            conn = sqlite3.connect(self.db_file, **kwargs)
+
+        for name, value in self.pragmas.items():
+            if value is None or (read_only and name in WRITER_ONLY_PRAGMAS):
+                continue
+            if not name.isidentifier():
+                raise ValueError(f"Invalid pragma name: {name!r}")
+            conn.execute(f"PRAGMA {name} = {value}")
+
+        for hook in list(self._connect_hooks.values()):
+            hook(conn)
+
+        with self._lock:
+            self._connections.append(conn)
+        self._close_on_thread_exit(conn)
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """
+        A read-only connection for reports, holding one consistent snapshot of the database for the
+        duration of the with block. It is separate from the thread's writing connection, and in WAL mode
+        its snapshot neither blocks nor waits for writers, so a long export does not stall vends.
+        An in-memory database has no second connection to offer; its reports use connection() instead.
+
+            with manager.reader() as snapshot:
+                totals = milkdb.sales_totals(snapshot, start, end)
+                orders = milkdb.get_orders_between(snapshot, start, end)  # same snapshot as totals
+
+        Yields:
+            sqlite3.Connection: The calling thread's read-only connection, inside a read transaction.
+        """
+        if self.db_file == ":memory:" or self.db_file.startswith("file:"):
+            yield self.connection()
+            return
+
+        conn = getattr(self._local, "reader", None)
+        if conn is not None and not conn.in_transaction and self._local.reader_version != self._hooks_version:
+            # Hooks changed since it was opened (e.g. archives attached or detached): start again
+            self._local.reader = None
+            self._close_own(conn)
+            conn = None
+        if conn is None:
+            self._local.reader_version = self._hooks_version
+            conn = self._local.reader = self._open(read_only=True)
+        if conn.in_transaction:
+            # Nested use joins the snapshot already held
+            yield conn
+            return
+
+        conn.execute("BEGIN")
+        try:
+            # A deferred BEGIN takes its snapshot at the first read, so read now to pin it
+            conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+            yield conn
+        finally:
+            conn.execute("ROLLBACK")
+
+    def set_connect_hook(self, name: str, hook):
+        """
+        Run hook(conn) on every connection opened from now on, e.g. to ATTACH databases or create temp views.
+        Setting a hook under an existing name replaces it; a hook of None removes it.
+        Connections already open in other threads pick it up after release(); reader() connections
+        are reopened on their next use.
+        """
+        if hook is None:
+            self._connect_hooks.pop(name, None)
+        else:
+            self._connect_hooks[name] = hook
+        self._hooks_version += 1
+
+    def release(self):
+        """
+        Close the calling thread's connections. The next call from this thread opens fresh ones.
+        """
+        for attribute in ("conn", "reader"):
+            conn = getattr(self._local, attribute, None)
+            if conn is None:
+                continue
+            setattr(self._local, attribute, None)
+            self._close_own(conn)
+
+    def close(self):
+        """
+        Close every connection the manager has opened, in all threads.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    # sqlite3.Connection interface, delegated to the calling thread's connection
+
+    def cursor(self, *args, **kwargs):
+        return self.connection().cursor(*args, **kwargs)
+
+    def execute(self, *args, **kwargs):
+        return self.connection().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self.connection().executemany(*args, **kwargs)
+
+    def commit(self):
+        self.connection().commit()
+
+    def rollback(self):
+        self.connection().rollback()
+
+    def __enter__(self):
+        self.connection().__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.connection().__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.connection(), name)
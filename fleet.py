@@ -0,0 +1,221 @@
+"""
+MILKIS FLEET MANAGER
+
+Holds many vending machines in one process on shared resources: one pooled connection manager,
+one deduplicated product table (product_id -> Product) and, per machine, only a fixed-size array of
+product ids laid out by the machine's slot grid (0 marks an empty slot).
+Memory for Product objects scales with the number of products, not machines x slots,
+and a product change is applied once for every machine that stocks it.
+"""
+
+from array import array
+from model import Product
+from slotgrid import DEFAULT_GRID, SlotView
+from dbpool import ConnectionManager
+from vendingapi import RESOLVE_CHUNK_SIZE, resolve_products
+
+PRODUCT_COLUMNS = 'id, product_name, price, product_company, quantity'
+
+
+class Fleet:
+    def __init__(self, conn):
+        """
+        Args:
+            conn: A dbpool.ConnectionManager (or sqlite3 connection) shared by every machine,
+                or a database path to open a ConnectionManager for.
+        """
+        self.connection = ConnectionManager(conn) if isinstance(conn, str) else conn
+        self.products = {}  # product_id -> Product, shared by every machine
+        self.machines = {}  # machine_id -> array of product ids, one per slot in grid order, 0 when empty
+        self.grids = {}  # machine_id -> slotgrid.SlotGrid
+        self._refcounts = {}  # product_id -> number of slots holding it, fleet-wide
+
+    ###MACHINES###
+    def add_machine(self, machine_id, grid=DEFAULT_GRID):
+        """
+        Register an empty machine with the slot layout of its model. Adding an existing machine leaves it as it is.
+
+        Returns:
+            array: The machine's slot array.
+        """
+        if machine_id not in self.machines:
+            self.machines[machine_id] = array('q', bytes(8 * len(grid)))
+            self.grids[machine_id] = grid
+        return self.machines[machine_id]
+
+    def remove_machine(self, machine_id):
+        """
+        Drop a machine and release the products it held.
+        """
+        self.grids.pop(machine_id, None)
+        for product_id in self.machines.pop(machine_id, ()):
+            if product_id:
+                self._release(product_id)
+
+    ###SLOTS###
+    def load_into(self, machine_id, slot_name: str, product_identifier):
+        """
+        Load a product, by name or ID, into one slot of one machine.
+
+        Returns:
+            bool: True if the product exists, False otherwise.
+        """
+        result = self.load_planograms({machine_id: {slot_name: product_identifier}})
+        return not result["missing"]
+
+    def load_planogram(self, machine_id, planogram: dict):
+        """
+        Load many slots of one machine at once.
+
+        Returns:
+            dict: "loaded" lists the filled slots and "missing" the identifiers that matched no product.
+        """
+        result = self.load_planograms({machine_id: planogram})
+        return {"loaded": result["loaded"].get(machine_id, []), "missing": result["missing"]}
+
+    def load_planograms(self, planograms: dict):
+        """
+        Load slots across many machines, resolving every identifier in the fleet with one query per chunk.
+        Machines not added yet are added with the default grid.
+
+        Args:
+            planograms (dict): machine_id -> {slot_name: product name or ID}.
+
+        Returns:
+            dict: "loaded" maps each machine to its filled slots and "missing" lists unmatched identifiers.
+
+        Raises:
+            ValueError: If a slot name is not in its machine's grid; nothing is loaded.
+        """
+        indexes = {machine_id: [self.grids.get(machine_id, DEFAULT_GRID).index(slot_name) for slot_name in planogram]
+                   for machine_id, planogram in planograms.items()}
+        found = resolve_products(self.connection, (identifier for planogram in planograms.values()
+                                                   for identifier in planogram.values()))
+        for row in found.values():
+            self.products[row[0]] = Product.from_row(row)
+
+        loaded = {}
+        missing = []
+        for machine_id, planogram in planograms.items():
+            slots = self.add_machine(machine_id)
+            for index, (slot_name, product_identifier) in zip(indexes[machine_id], planogram.items()):
+                row = found.get(product_identifier)
+                if row is None:
+                    missing.append(product_identifier)
+                    continue
+                previous = slots[index]
+                slots[index] = row[0]
+                self._refcounts[row[0]] = self._refcounts.get(row[0], 0) + 1
+                if previous:
+                    self._release(previous)
+                loaded.setdefault(machine_id, []).append(slot_name)
+        return {"loaded": loaded, "missing": list(dict.fromkeys(missing))}
+
+    def remove_from(self, machine_id, slot_name: str):
+        """
+        Empty one slot.
+
+        Returns:
+            Product or None: The removed product, or None if the slot was empty.
+        """
+        index = self._index(machine_id, slot_name)
+        if index is None:
+            return None
+        slots = self.machines[machine_id]
+        product_id = slots[index]
+        if not product_id:
+            return None
+        slots[index] = 0
+        product = self.products.get(product_id)
+        self._release(product_id)
+        return product
+
+    def get_product(self, machine_id, slot_name: str):
+        """
+        Returns:
+            Product or None: The product in the slot, or None if the slot is empty.
+        """
+        index = self._index(machine_id, slot_name)
+        return None if index is None else self.products.get(self.machines[machine_id][index])
+
+    def list_products(self, machine_id):
+        """
+        Returns:
+            dict: The machine's slots and their products in slot order, like VendingMachine.list_products.
+        """
+        if machine_id not in self.machines:
+            return {}
+        products = self.products
+        codes = self.grids[machine_id].codes
+        return {codes[index]: products[product_id]
+                for index, product_id in enumerate(self.machines[machine_id])
+                if product_id in products}
+
+    def slots(self, machine_id):
+        """
+        Returns:
+            SlotView: dict-like view of one machine's filled slots (slot_name: product_id).
+        """
+        if machine_id not in self.machines:
+            return {}
+        return SlotView(self.grids[machine_id], self.machines[machine_id], empty=0)
+
+    ###FLEET-WIDE OPERATIONS###
+    def reload_product(self, product_id: int):
+        """
+        Re-read one product; every machine stocking it sees the change at once.
+        """
+        return self.reload_products([product_id])
+
+    def reload_products(self, product_ids=None):
+        """
+        Re-read the given products, or every product the fleet holds, in one pass.
+
+        Products that no longer exist are dropped, so the slots holding them read as empty.
+
+        Returns:
+            dict: "reloaded" counts refreshed products and "removed" lists IDs no longer in the database.
+        """
+        product_ids = list(self.products if product_ids is None else product_ids)
+        product_ids = [product_id for product_id in product_ids if product_id in self._refcounts]
+
+        cursor = self.connection.cursor()
+        refreshed = {}
+        for start in range(0, len(product_ids), RESOLVE_CHUNK_SIZE):
+            chunk = product_ids[start:start + RESOLVE_CHUNK_SIZE]
+            cursor.execute(f"SELECT {PRODUCT_COLUMNS} FROM inventory WHERE id IN ({', '.join('?' * len(chunk))})",
+                           chunk)
+            for row in cursor.fetchall():
+                refreshed[row[0]] = Product.from_row(row)
+
+        removed = [product_id for product_id in product_ids if product_id not in refreshed]
+        for product_id in removed:
+            self.products.pop(product_id, None)
+        self.products.update(refreshed)
+        return {"reloaded": len(refreshed), "removed": removed}
+
+    def machines_with(self, product_id: int):
+        """
+        Returns:
+            list: IDs of the machines with product_id in at least one slot.
+        """
+        if product_id not in self._refcounts:
+            return []
+        return [machine_id for machine_id, slots in self.machines.items() if product_id in slots]
+
+    def close(self):
+        self.connection.close()
+
+    def _index(self, machine_id, slot_name: str):
+        # The array index of a slot, or None if the machine or slot does not exist
+        grid = self.grids.get(machine_id)
+        return None if grid is None else grid.lookup(slot_name)
+
+    def _release(self, product_id: int):
+        # Forget a product once no slot in the fleet holds it
+        count = self._refcounts.get(product_id, 0) - 1
+        if count > 0:
+            self._refcounts[product_id] = count
+        else:
+            self._refcounts.pop(product_id, None)
+            self.products.pop(product_id, None)
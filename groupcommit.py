@@ -0,0 +1,163 @@
+"""
+MILKIS GROUP-COMMIT WRITER FOR ORDER HISTORY
+
+Queues orderhistory inserts and writes them in one transaction once max_rows are waiting
+or the oldest queued row is max_delay_ms old, whichever comes first.
+Rows still queued are lost if the process dies, so max_delay_ms bounds the durability window.
+The writer commits through connections of its own, so a flush never commits or rolls back a caller's transaction.
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from dbpool import ConnectionManager
+
+
+def _own_connections(conn):
+    # A ConnectionManager for the same database file as conn, separate from the caller's connections
+    if isinstance(conn, str):
+        return ConnectionManager(conn)
+    if isinstance(conn, ConnectionManager):
+        return ConnectionManager(conn.db_file, conn.pragmas, **conn.connect_kwargs)
+    db_file = conn.execute('PRAGMA database_list').fetchone()[2]
+    if not db_file:
+        raise ValueError("OrderHistoryWriter needs a database file, not an in-memory or temporary database")
+    return ConnectionManager(db_file)
+
+
+class OrderHistoryWriter:
+    def __init__(self, conn, max_rows: int = 100, max_delay_ms: float = 50):
+        """
+        Start a writer for the orderhistory table.
+
+        Args:
+            conn: The database to write to, as a dbpool.ConnectionManager, a sqlite3 connection or a path.
+                The writer opens its own connections to the same file and closes them in close().
+            max_rows (int): Flush as soon as this many rows are queued.
+            max_delay_ms (float): Flush once the oldest queued row has waited this long.
+        """
+        if max_rows < 1:
+            raise ValueError("max_rows must be at least 1")
+        self.conn = _own_connections(conn)
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000.0
+        self.last_error = None
+        self._pending = []
+        self._oldest = None  # monotonic time the oldest pending row was queued
+        self._closed = False
+        self._failing = False  # the last flush failed, so the background thread waits max_delay_ms before retrying
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = threading.Thread(target=self._run, name="orderhistory-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def record(self, product_id: int, cost: float, quantity: int):
+        """
+        Queue an orderhistory row. The transaction date is taken now, not at flush time.
+        A full batch is flushed by this call, so a flush error is raised here.
+        """
+        if self._queue([(product_id, cost, quantity)]):
+            self.flush()
+
+    def record_many(self, rows):
+        """
+        Queue (product_id, cost, quantity) orderhistory rows without ever writing them in this call.
+        A full batch is handed to the background thread, and a flush failure ends up in last_error.
+
+        Raises:
+            RuntimeError: If the writer is closed; nothing is queued.
+        """
+        self._queue(rows)
+
+    def _queue(self, rows):
+        # Append rows stamped with the current time; True once a full batch is waiting
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("OrderHistoryWriter is closed")
+            was_empty = not self._pending
+            self._pending.extend((product_id, now, cost, quantity) for product_id, cost, quantity in rows)
+            full = len(self._pending) >= self.max_rows
+            if was_empty and self._pending:
+                self._oldest = time.monotonic()
+                self._wakeup.notify()
+            elif full:
+                self._wakeup.notify()
+            return full
+
+    def flush(self):
+        """
+        Write every queued row in a single transaction.
+
+        Returns:
+            int: The number of rows written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._oldest = None
+            if not batch:
+                return 0
+
+            try:
+                self.conn.executemany('''
+                    INSERT INTO orderhistory (product_id, transaction_date, cost, quantity)
+                    VALUES (?, ?, ?, ?)''', batch)
+                self.conn.commit()
+            except sqlite3.Error as e:
+                # Put the rows back in front so nothing is dropped or reordered
+                self.conn.rollback()
+                with self._lock:
+                    self._pending[:0] = batch
+                    self._oldest = time.monotonic()
+                    self._failing = True
+                self.last_error = e
+                raise
+
+            self._failing = False
+
+            return len(batch)
+
+    def pending(self):
+        # Number of rows waiting to be written
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        """
+        Stop the background flusher, write whatever is still queued and close the writer's connections.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join()
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._closed and self._oldest is None:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                remaining = self._oldest + self.max_delay - time.monotonic()
+                if remaining > 0 and (self._failing or len(self._pending) < self.max_rows):
+                    self._wakeup.wait(remaining)
+                    continue
+
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # Kept in last_error; the rows stay queued and are retried after another delay
+                pass
@@ -0,0 +1,307 @@
+"""
+MILKIS INSTRUMENTATION
+
+Per-operation call counts, rows touched, SQL statements, commits and latency percentiles
+for the milkdb functions and VendingMachine methods decorated with @instrumented.
+
+Recording is off unless MILKIS_INSTRUMENT=1 is set in the environment or enable() is called.
+While off, a decorated call costs one flag check on top of the call itself.
+"""
+
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+ENV_VAR = "MILKIS_INSTRUMENT"
+MAX_SAMPLES = 10000  # latencies kept per operation for the percentiles
+
+_enabled = os.environ.get(ENV_VAR, "").lower() not in ("", "0", "false", "no")
+_stats = {}
+_lock = threading.Lock()
+_local = threading.local()
+_listeners = {}  # id(raw connection) -> (connection, trace callback installed with set_trace_callback)
+
+
+class _OperationStats:
+    __slots__ = ("calls", "errors", "rows", "statements", "commits", "total_time", "samples")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.statements = 0
+        self.commits = 0
+        self.total_time = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+
+class _Frame:
+    # Counters for one in-flight call; the SQL trace callback adds to every frame on the thread's stack
+    __slots__ = ("statements", "commits")
+
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+
+
+def enable(flag: bool = True):
+    """
+    Turn recording on or off for the whole process.
+    """
+    global _enabled
+    _enabled = flag
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """
+    Forget everything recorded so far.
+    """
+    with _lock:
+        _stats.clear()
+
+
+def stats():
+    """
+    Take a snapshot of everything recorded so far.
+
+    Returns:
+        dict: Operation name to calls, errors, rows, statements, commits, total_ms, mean_ms,
+            p50_ms, p95_ms and p99_ms. Percentiles cover the most recent MAX_SAMPLES calls.
+    """
+    with _lock:
+        snapshot = {name: (op.calls, op.errors, op.rows, op.statements, op.commits, op.total_time, sorted(op.samples))
+                    for name, op in _stats.items()}
+
+    report = {}
+    for name, (calls, errors, rows, statements, commits, total_time, samples) in snapshot.items():
+        report[name] = {
+            "calls": calls,
+            "errors": errors,
+            "rows": rows,
+            "statements": statements,
+            "commits": commits,
+            "total_ms": total_time * 1000,
+            "mean_ms": total_time * 1000 / calls if calls else 0.0,
+            "p50_ms": _percentile(samples, 0.50),
+            "p95_ms": _percentile(samples, 0.95),
+            "p99_ms": _percentile(samples, 0.99),
+        }
+    return report
+
+
+def _percentile(samples, fraction: float):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000
+
+
+def instrumented(fn):
+    """
+    Record every call to fn while instrumentation is enabled.
+
+    The connection is taken from a parameter named conn, or from self.connection for methods.
+    Generator functions are timed from the first row to the last and count the rows they yield;
+    their statements are traced while the generator runs, each time it is resumed.
+    """
+    name = f"{fn.__module__}.{fn.__qualname__}"
+    parameters = list(inspect.signature(fn).parameters)
+    conn_index = parameters.index("conn") if "conn" in parameters else None
+    is_method = parameters[:1] == ["self"]
+
+    def find_connection(args, kwargs):
+        if "conn" in kwargs:
+            return kwargs["conn"]
+        if conn_index is not None and conn_index < len(args):
+            return args[conn_index]
+        if is_method and args:
+            return getattr(args[0], "connection", None)
+        return None
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(*args, **kwargs):
+            if not _enabled:
+                return (yield from fn(*args, **kwargs))
+            raw = _raw_connection(find_connection(args, kwargs))
+            frame = _Frame()
+            rows = 0
+            failed = True
+            generator = fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                while True:
+                    # The statements of each page are traced while the generator runs, not while the caller does
+                    install = _enter(raw, frame)
+                    try:
+                        row = next(generator)
+                    except StopIteration:
+                        break
+                    finally:
+                        _exit(raw, install)
+                    rows += 1
+                    yield row
+                failed = False
+            except GeneratorExit:
+                failed = False  # the caller stopped reading early
+                generator.close()
+                raise
+            finally:
+                _record(name, time.perf_counter() - start, failed, rows, frame)
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+
+        raw = _raw_connection(find_connection(args, kwargs))
+        frame = _Frame()
+        install = _enter(raw, frame)
+        changes_before = raw.total_changes if raw is not None else 0
+
+        failed = True
+        result = None
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            rows = 0
+            if raw is not None:
+                try:
+                    rows = raw.total_changes - changes_before
+                except Exception:
+                    pass  # the call closed its connection
+            if isinstance(result, list):
+                rows += len(result)
+            _exit(raw, install)
+            _record(name, elapsed, failed, rows, frame)
+
+    return wrapper
+
+
+def _enter(raw, frame: _Frame):
+    # Push frame on the thread's stack and trace raw unless an outer call already does; True if it was installed
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+        _local.traced = set()
+    stack.append(frame)
+    install = raw is not None and id(raw) not in _local.traced
+    if install:
+        _install(raw)
+        _local.traced.add(id(raw))
+    return install
+
+
+def _exit(raw, install: bool):
+    _local.stack.pop()
+    if install:
+        _local.traced.discard(id(raw))
+        try:
+            raw.set_trace_callback(_listener(raw))
+        except Exception:
+            pass  # the call closed its connection
+
+
+def _install(raw):
+    # sqlite3 keeps one trace callback per connection, so chain to one registered with set_trace_callback
+    listener = _listener(raw)
+    if listener is None:
+        raw.set_trace_callback(_trace)
+    else:
+        def chained(statement: str):
+            listener(statement)
+            _trace(statement)
+        raw.set_trace_callback(chained)
+
+
+@contextmanager
+def tracing(conn):
+    """
+    Count the statements run on conn towards the instrumented calls running on this thread, for calls that
+    do their SQL on a connection other than the one they were given (e.g. a ConnectionManager.reader() snapshot).
+    """
+    raw = _raw_connection(conn) if _enabled and getattr(_local, "stack", None) else None
+    if raw is None or id(raw) in _local.traced:
+        yield
+        return
+    _install(raw)
+    _local.traced.add(id(raw))
+    try:
+        yield
+    finally:
+        _local.traced.discard(id(raw))
+        try:
+            raw.set_trace_callback(_listener(raw))
+        except Exception:
+            pass  # the connection was closed
+
+
+def _listener(raw):
+    entry = _listeners.get(id(raw))
+    return entry[1] if entry is not None and entry[0] is raw else None
+
+
+def set_trace_callback(conn, callback):
+    """
+    Set a SQL trace callback on a connection (or a ConnectionManager's connection for this thread)
+    that keeps running while instrumented calls trace the same connection.
+
+    sqlite3 connections hold a single trace callback, and this module cannot read back one set with
+    Connection.set_trace_callback directly: that one is dropped by the first instrumented call on the connection.
+
+    Args:
+        callback: Called with every SQL statement, or None to remove it. Remove it before closing the
+            connection, as the callback keeps a reference to it until then.
+    """
+    raw = _raw_connection(conn)
+    if callback is None:
+        _listeners.pop(id(raw), None)
+    else:
+        _listeners[id(raw)] = (raw, callback)
+    if id(raw) in getattr(_local, "traced", ()):
+        _install(raw)
+    else:
+        raw.set_trace_callback(callback)
+
+
+def _raw_connection(conn):
+    # A ConnectionManager hands out the calling thread's sqlite3 connection
+    if conn is None:
+        return None
+    connection = getattr(conn, "connection", None)
+    raw = connection() if callable(connection) else conn
+    return raw if hasattr(raw, "set_trace_callback") else None
+
+
+def _trace(statement: str):
+    is_commit = statement.lstrip()[:6].upper() == "COMMIT"
+    for frame in getattr(_local, "stack", ()):
+        frame.statements += 1
+        if is_commit:
+            frame.commits += 1
+
+
+def _record(name: str, elapsed: float, failed: bool, rows: int, frame: _Frame):
+    with _lock:
+        op = _stats.get(name)
+        if op is None:
+            op = _stats[name] = _OperationStats()
+        op.calls += 1
+        op.errors += failed
+        op.rows += rows
+        op.statements += frame.statements
+        op.commits += frame.commits
+        op.total_time += elapsed
+        op.samples.append(elapsed)
@@ -0,0 +1,201 @@
+"""
+MILKIS INVENTORY CACHE
+
+An opt-in, write-through, LRU-bounded cache of inventory rows in front of milkdb.
+Rows are indexed by id and by product_name. Writes made through the cache update it directly;
+writes made elsewhere are noticed through PRAGMA data_version (other connections)
+and the connection's total_changes (this connection), and drop the cached rows.
+"""
+
+import threading
+from collections import OrderedDict
+import milkdb
+from model import Product
+
+PRODUCT_COLUMNS = 'id, product_name, price, product_company, quantity'
+
+
+class InventoryCache:
+    def __init__(self, conn, max_size: int = 10000):
+        """
+        Args:
+            conn: A sqlite3 connection or dbpool.ConnectionManager.
+            max_size (int): Most rows kept; the least recently used row is evicted beyond this.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.conn = conn
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._rows = OrderedDict()  # id -> (id, product_name, price, product_company, quantity), LRU order
+        self._ids_by_name = {}
+        self._complete = False  # True while _rows holds every inventory row
+        self._versions = {}  # raw connection -> (data_version, total_changes) at the last sync
+        self._lock = threading.RLock()
+
+    ###READS###
+    def get_product(self, product_id: int):
+        # Same result as milkdb.get_product: (product_name, price) or None
+        row = self.get_row(product_id)
+        return None if row is None else (row[1], row[2])
+
+    def get_row(self, product_id: int):
+        # The full inventory row for product_id, or None
+        with self._lock:
+            self._check_versions()
+            row = self._rows.get(product_id)
+            if row is not None:
+                self.hits += 1
+                self._rows.move_to_end(product_id)
+                return row
+            self.misses += 1
+            return self._load('id = ?', (product_id,))
+
+    def get_row_by_name(self, product_name: str):
+        # The full inventory row for product_name, or None
+        with self._lock:
+            self._check_versions()
+            product_id = self._ids_by_name.get(product_name)
+            if product_id is not None:
+                self.hits += 1
+                self._rows.move_to_end(product_id)
+                return self._rows[product_id]
+            self.misses += 1
+            return self._load('product_name = ?', (product_name,))
+
+    def get_products(self):
+        # Same result as milkdb.get_products; served from memory once the whole table fits in the cache
+        with self._lock:
+            self._check_versions()
+            if self._complete:
+                self.hits += 1
+                return sorted(self._rows.values())
+
+            self.misses += 1
+            products = milkdb.get_products(self.conn)
+            if len(products) <= self.max_size:
+                self._clear()
+                for row in products:
+                    self._put(row)
+                self._complete = True
+                self._sync_versions()
+            return products
+
+    ###WRITES###
+    def create_product(self, product: Product):
+        with self._lock:
+            self._check_versions()
+            milkdb.create_product(product, self.conn)
+            self._refresh('product_name = ?', (product.product_name,))
+
+    def update_product(self, product_id: int, product: Product):
+        with self._lock:
+            self._check_versions()
+            self._discard(product_id)  # the name may change
+            result = milkdb.update_product(self.conn, product_id, product)
+            self._refresh('id = ?', (product_id,))
+            return result
+
+    def add_quantity(self, item_name: str, quantity_to_add: int = 1):
+        with self._lock:
+            self._check_versions()
+            result = milkdb.add_quantity(self.conn, item_name, quantity_to_add)
+            self._refresh('product_name = ?', (item_name,))
+            return result
+
+    def delete_productID(self, product_id: int):
+        with self._lock:
+            self._check_versions()
+            result = milkdb.delete_productID(product_id, self.conn)
+            self._discard(product_id)
+            self._sync_versions()
+            return result
+
+    def delete_productname(self, product_name: str):
+        with self._lock:
+            self._check_versions()
+            result = milkdb.delete_productname(product_name, self.conn)
+            product_id = self._ids_by_name.get(product_name)
+            if product_id is not None:
+                self._discard(product_id)
+            self._sync_versions()
+            return result
+
+    ###MAINTENANCE###
+    def invalidate(self):
+        # Forget every cached row
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._rows),
+                "max_size": self.max_size,
+            }
+
+    def _load(self, where: str, params: tuple):
+        row = self.conn.execute(f'SELECT {PRODUCT_COLUMNS} FROM inventory WHERE {where}', params).fetchone()
+        if row is not None:
+            self._put(row)
+        return row
+
+    def _refresh(self, where: str, params: tuple):
+        # Re-read a row this cache just wrote; a complete cache stays complete unless _put has to evict
+        self._load(where, params)
+        self._sync_versions()
+
+    def _put(self, row):
+        old = self._rows.get(row[0])
+        if old is not None and old[1] != row[1]:
+            self._ids_by_name.pop(old[1], None)
+        self._rows[row[0]] = row
+        self._rows.move_to_end(row[0])
+        self._ids_by_name[row[1]] = row[0]
+
+        while len(self._rows) > self.max_size:
+            _, evicted = self._rows.popitem(last=False)
+            self._ids_by_name.pop(evicted[1], None)
+            self.evictions += 1
+            self._complete = False
+
+    def _discard(self, product_id: int):
+        row = self._rows.pop(product_id, None)
+        if row is not None:
+            self._ids_by_name.pop(row[1], None)
+
+    def _clear(self):
+        self._rows.clear()
+        self._ids_by_name.clear()
+        self._complete = False
+
+    def _raw_connection(self):
+        # A ConnectionManager hands each thread its own connection; versions are tracked per connection
+        connection = getattr(self.conn, "connection", None)
+        return connection() if callable(connection) else self.conn
+
+    def _current_versions(self, raw):
+        return raw.execute('PRAGMA data_version').fetchone()[0], raw.total_changes
+
+    def _check_versions(self):
+        # Drop everything if the database changed since the last sync through anything but this cache
+        raw = self._raw_connection()
+        current = self._current_versions(raw)
+        if self._versions.get(raw) != current:
+            self._clear()
+            self._versions[raw] = current
+
+    def _sync_versions(self):
+        # Called after this cache's own writes, which move total_changes but not data_version;
+        # a data_version change still means another connection committed in between
+        raw = self._raw_connection()
+        current = self._current_versions(raw)
+        previous = self._versions.get(raw)
+        if previous is None or previous[0] != current[0]:
+            self._clear()
+        self._versions[raw] = current
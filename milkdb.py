@@ -4,44 +4,64 @@ MILKIS VENDING MACHINE DATABASE INTERACTION CODE
 1. Create the database with four tables: Inventory, Order history, vending machines
 """
 
+import contextlib
+import functools
 from pydantic import BaseModel
-from model import Product
+from model import Product, ProductView
+import random
+import re
 import sqlite3
+import threading
+import time
+from datetime import date, datetime
 from prettytable import PrettyTable
-
-def setUpDB():
-    DB_FILE = 'milkis.db'
-
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    # Creating the inventory table in the database
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS inventory (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_name TEXT NOT NULL UNIQUE,
-            price REAL NOT NULL,
-            product_company TEXT DEFAULT NULL,
-            quantity INTEGER DEFAULT 0
-        )
-    ''')
-
-    # Creating the Order History table in the database
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS orderhistory (
-        transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        product_id INTEGER,
-        transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        cost REAL NOT NULL,
-        quantity INTEGER NOT NULL,
-        FOREIGN KEY (product_id) REFERENCES inventory(id)
-    )
-    ''')
-
-    conn.commit()
+from renderers import render
+from dbpool import ConnectionManager
+from instrumentation import instrumented, tracing
+from schema import ensure_schema
+
+DB_FILE = 'milkis.db'
+
+
+def _reporting(fn=None, *, errors: bool = False):
+    # Reports given a ConnectionManager run on its read-only snapshot connection (ConnectionManager.reader),
+    # so a long scan never shares a connection or a lock with vends and sees one consistent database
+    # a plain sqlite3 connection, or a snapshot connection passed in by the caller, is used as it is
+    # the snapshot's statements count towards @instrumented, and with errors=True a snapshot that cannot be
+    # opened is returned as the report's {"message": "Error: ..."} dict rather than raised
+    if fn is None:
+        return functools.partial(_reporting, errors=errors)
+
+    @functools.wraps(fn)
+    def wrapper(conn, *args, **kwargs):
+        reader = getattr(conn, 'reader', None)
+        if not callable(reader):
+            return fn(conn, *args, **kwargs)
+        with contextlib.ExitStack() as stack:
+            try:
+                snapshot = stack.enter_context(reader())
+            except sqlite3.Error as e:
+                if errors:
+                    return {"message": f"Error: {e}"}
+                raise
+            with tracing(snapshot):
+                return fn(snapshot, *args, **kwargs)
+    return wrapper
+
+
+@instrumented
+def setUpDB(conn=None):
+    # Brings the schema on the given connection (or a pooled ConnectionManager for DB_FILE) up to date and returns it
+    # Every function in this module accepts either a sqlite3 connection or a ConnectionManager as conn
+    # Only migrations the database is behind on run (see schema.py); the caller owns and closes conn
+    if conn is None:
+        conn = ConnectionManager(DB_FILE)
+    ensure_schema(conn)
+    return conn
 
 
 ###INVENTORY TABLE OPERATIONS###
+@instrumented
 def create_product(product: Product, conn):
     # Creates a new unique product in the database
     cursor = conn.cursor()
@@ -51,6 +71,7 @@ def create_product(product: Product, conn):
     conn.commit()
 
 
+@instrumented
 def get_products(conn):
     # Returns a list of all products in the database
     cursor = conn.cursor()
@@ -59,6 +80,31 @@ def get_products(conn):
     return products
 
 
+@instrumented
+def iter_products(conn, batch_size: int = 500, after_id: int = 0, as_view: bool = False):
+    # Yields every product like get_products, one keyset page of batch_size rows at a time
+    # only one page is held in memory and no read transaction stays open between pages
+    # pass the last id seen as after_id to resume where a previous read stopped
+    # as_view=True yields model.ProductView rows, which read by field name for the cost of a tuple
+    cursor = conn.cursor()
+    last_id = after_id
+    while True:
+        cursor.execute('''
+            SELECT id, product_name, price, product_company, quantity
+            FROM inventory
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?''', (last_id, batch_size))
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        if as_view:
+            rows = list(map(ProductView._make, rows))
+        yield from rows
+        last_id = rows[-1][0]
+
+
+@instrumented
 def get_product(conn, product_id: int):
     # Function to return a single product with the product_id identifier
     cursor = conn.cursor()
@@ -67,6 +113,7 @@ def get_product(conn, product_id: int):
     return product
 
 
+@instrumented
 def update_product(conn, product_id: int, product: Product):
     # Pass a new product object to update the product at the location of the product id in the database
     cursor = conn.cursor()
@@ -79,6 +126,7 @@ def update_product(conn, product_id: int, product: Product):
     return product
 
 
+@instrumented
 def add_quantity(conn, item_name: str, quantity_to_add: int = 1):
     # modify the item in the database to add some integer quantity
     # will mainly be used when putting in orders
@@ -88,6 +136,7 @@ def add_quantity(conn, item_name: str, quantity_to_add: int = 1):
     return True
 
 
+@instrumented
 def delete_productID(product_id: int, conn):
     # Delete a product by ID from the database
     cursor = conn.cursor()
@@ -96,6 +145,7 @@ def delete_productID(product_id: int, conn):
     return {"message": "Product deleted"}
 
 
+@instrumented
 def delete_productname(product_name: str, conn):
     # Check if the product exists in the database
     cursor = conn.cursor()
@@ -112,13 +162,15 @@ def delete_productname(product_name: str, conn):
     return {"message": "Product deleted"}
 
 
+@instrumented
+@_reporting(errors=True)
 def display_inventory_table(conn):
     # Display the entire inventory as a table
 
     try:
         # Execute a SELECT query to retrieve all entries from the inventory table
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM inventory')
+        cursor.execute('SELECT id, product_name, price, product_company, quantity FROM inventory')
         products = cursor.fetchall()
 
         if not products:
@@ -136,74 +188,256 @@ def display_inventory_table(conn):
     except sqlite3.Error as e:
         return {"message": f"Error: {e}"}
 
-def shutdown_event(conn):
-    conn.close()
 
+# Headers for the human-readable report formats; csv and ndjson keep the column names
+REPORT_HEADERS = {
+    "inventory": ["ID", "Product Name", "Price", "Product Company", "Quantity"],
+    "orderhistory": ["Transaction ID", "Product ID", "Transaction Date", "Price", "Quantity"],
+}
+REPORT_COLUMNS = {
+    "inventory": "id, product_name, price, product_company, quantity",
+    "orderhistory": "transaction_id, product_id, transaction_date, cost, quantity",
+}
 
-###INVENTORY TABLE OPERTATIONS END###
 
-''''
-###TRANSACTION TABLE OPERATIONS###
-def order(product_id: int, qty: int):
-    # orders a quantity of the product and creates an entry in the order history table
+def _stream_table(conn, table, order_by, out, fmt):
+    # Streams every row of table to out from a single cursor, without holding the table in memory
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT {REPORT_COLUMNS[table]} FROM {table} ORDER BY {order_by}')
+    columns = REPORT_HEADERS[table] if fmt in ("text", "pretty") else None
+    return render(cursor, out, fmt, columns)
 
+
+@instrumented
+@_reporting(errors=True)
+def stream_inventory_table(conn, out, fmt: str = "text"):
+    # Writes the inventory to out as text, csv, ndjson or pretty (see renderers.py)
+    # unlike display_inventory_table this never builds the whole table as one string
     try:
-        # Find the product in the inventory and get its current quantity
-        cursor.execute('SELECT product_name, quantity, price FROM inventory WHERE id = ?', (product_id,))
-        product_info = cursor.fetchone()
+        count = _stream_table(conn, "inventory", "id", out, fmt)
+        return {"message": f"Wrote {count} product(s)", "rows": count}
 
-        if product_info is None:
-            return {"message": "Product not found"}
+    except sqlite3.Error as e:
+        return {"message": f"Error: {e}"}
 
-        product_name, current_quantity, product_price = product_info
 
-        # Calculate the new quantity after adding qty
-        new_quantity = current_quantity + qty
-        cost = product_price * qty
+@instrumented
+def shutdown_event(conn, writer=None):
+    # Drain a group-commit OrderHistoryWriter before closing the connection it writes through
+    if writer is not None:
+        writer.close()
+    conn.close()
 
-        # Update the quantity in the inventory table
-        add_quantity(product_name, qty)
 
-        # cursor.execute('UPDATE inventory SET quantity = ? WHERE id = ?', (new_quantity, product_id))
-        conn.commit()
+###INVENTORY TABLE OPERTATIONS END###
 
-        # Insert a new row into the orderhistory table
-        cursor.execute('INSERT INTO orderhistory (product_id, cost, quantity) VALUES (?, ?, ?)',
-                       (product_id, cost, qty))  # You need to specify the actual price and price_per_product values
-        conn.commit()
+###TRANSACTION TABLE OPERATIONS###
+ORDER_CHUNK_SIZE = 500
+VEND_MAX_RETRIES = 8
+VEND_BACKOFF_BASE = 0.002  # seconds before the first retry, doubled on every further attempt
+VEND_BACKOFF_MAX = 0.1
+
+_vend_counters = {"vends": 0, "insufficient_stock": 0, "not_found": 0, "busy": 0, "retries": 0, "errors": 0}
+_vend_counters_lock = threading.Lock()  # guards the counters only, never held while talking to SQLite
+
+
+@instrumented
+def order_many(conn, lines, writer=None):
+    # orders several (product_id, qty) lines in a single transaction
+    # prices are looked up in bulk, every inventory bump and orderhistory row is written with executemany
+    # if any line fails nothing is written
+    # with a groupcommit.OrderHistoryWriter the history rows are queued on it instead of written inline;
+    # they are only queued once the inventory commit succeeded, and a later flush failure stays on the writer
+    lines = [(int(product_id), int(qty)) for product_id, qty in lines]
+    if not lines:
+        return {"message": "Ordered 0 line(s)", "results": []}
+    if writer is not None and writer.closed:
+        return {"message": "Error: OrderHistoryWriter is closed"}
+
+    try:
+        cursor = conn.cursor()
 
-        return {"message": f"Ordered {qty} {product_name}(s)"}
+        # Look up name and price for every distinct product, chunked to stay under the SQL variable limit
+        product_ids = list(dict.fromkeys(product_id for product_id, _ in lines))
+        products = {}
+        for start in range(0, len(product_ids), ORDER_CHUNK_SIZE):
+            chunk = product_ids[start:start + ORDER_CHUNK_SIZE]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'SELECT id, product_name, price FROM inventory WHERE id IN ({placeholders})', chunk)
+            for product_id, product_name, price in cursor.fetchall():
+                products[product_id] = (product_name, price)
+
+        missing = [product_id for product_id in product_ids if product_id not in products]
+        if missing:
+            return {"message": f"Product not found: {', '.join(map(str, missing))}"}
+
+        results = []
+        history_rows = []
+        for product_id, qty in lines:
+            product_name, price = products[product_id]
+            cost = price * qty
+            history_rows.append((product_id, cost, qty))
+            results.append({"product_id": product_id, "product_name": product_name, "quantity": qty, "cost": cost})
+
+        cursor.executemany('UPDATE inventory SET quantity = quantity + ? WHERE id = ?',
+                           [(qty, product_id) for product_id, qty in lines])
+        if writer is None:
+            cursor.executemany('INSERT INTO orderhistory (product_id, cost, quantity) VALUES (?, ?, ?)', history_rows)
+        conn.commit()
 
     except sqlite3.Error as e:
+        conn.rollback()
         return {"message": f"Error: {e}"}
 
+    if writer is not None:
+        try:
+            writer.record_many(history_rows)
+        except RuntimeError:
+            # The writer was closed after the check above; the stock is committed, so write the history here
+            conn.executemany('INSERT INTO orderhistory (product_id, cost, quantity) VALUES (?, ?, ?)', history_rows)
+            conn.commit()
+
+    return {"message": f"Ordered {len(results)} line(s)", "results": results}
+
+
+@instrumented
+def order(conn, product_id: int, qty: int, writer=None):
+    # orders a quantity of the product and creates an entry in the order history table
+    result = order_many(conn, [(product_id, qty)], writer)
 
-def void_order(transaction_id: int):
+    if "results" not in result:
+        if result["message"].startswith("Product not found"):
+            return {"message": "Product not found"}
+        return result
+
+    product_name = result["results"][0]["product_name"]
+    return {"message": f"Ordered {qty} {product_name}(s)"}
+
+
+@instrumented
+def vend(conn, product_id: int, qty: int = 1, max_retries: int = VEND_MAX_RETRIES):
+    # sells qty of a product without ever overselling
+    # the stock check and decrement are one conditional UPDATE, written with the orderhistory row in one transaction
+    # SQLITE_BUSY is retried up to max_retries times with jittered exponential backoff
+    if qty < 1:
+        return {"message": "Quantity must be at least 1"}
+    if max_retries < 0:
+        return {"message": "max_retries must not be negative"}
+    if conn.in_transaction:
+        # BEGIN IMMEDIATE cannot nest, and committing would take the caller's pending work with it
+        return {"message": "Error: commit or roll back the open transaction before vending"}
+
+    for attempt in range(max_retries + 1):
+        try:
+            cursor = conn.cursor()
+            # Take the write lock up front so contention shows up here rather than as a deadlock mid-transaction
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('UPDATE inventory SET quantity = quantity - ? WHERE id = ? AND quantity >= ?',
+                           (qty, product_id, qty))
+
+            if cursor.rowcount == 0:
+                cursor.execute('SELECT COUNT(*) FROM inventory WHERE id = ?', (product_id,))
+                found = cursor.fetchone()[0]
+                conn.rollback()
+                if not found:
+                    _count_vend("not_found")
+                    return {"message": "Product not found"}
+                _count_vend("insufficient_stock")
+                return {"message": "Insufficient stock"}
+
+            cursor.execute('SELECT product_name, price FROM inventory WHERE id = ?', (product_id,))
+            product_name, price = cursor.fetchone()
+            cursor.execute('INSERT INTO orderhistory (product_id, cost, quantity) VALUES (?, ?, ?)',
+                           (product_id, price * qty, qty))
+            conn.commit()
+
+            _count_vend("vends")
+            return {"message": f"Vended {qty} {product_name}(s)"}
+
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not _is_busy(e):
+                _count_vend("errors")
+                return {"message": f"Error: {e}"}
+            _count_vend("busy")
+            if attempt == max_retries:
+                _count_vend("errors")
+                return {"message": f"Error: {e}"}
+            _count_vend("retries")
+            time.sleep(random.uniform(0, min(VEND_BACKOFF_MAX, VEND_BACKOFF_BASE * 2 ** attempt)))
+
+
+def _is_busy(error):
+    # SQLITE_BUSY and its extended codes, falling back to the message on Pythons without sqlite_errorcode
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff == sqlite3.SQLITE_BUSY
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+def _count_vend(counter: str):
+    with _vend_counters_lock:
+        _vend_counters[counter] += 1
+
+
+def vend_counters():
+    # Returns a snapshot of the vend outcome, contention (busy) and retry counters
+    with _vend_counters_lock:
+        return dict(_vend_counters)
+
+
+def reset_vend_counters():
+    with _vend_counters_lock:
+        for counter in _vend_counters:
+            _vend_counters[counter] = 0
+
+
+@instrumented
+def void_order(conn, transaction_id: int):
     # Void an order by the transaction id
+    # orders moved to an attached archive partition are found and voided there
 
     try:
-        # Check if the transaction exists in the orderhistory table
-        cursor.execute('SELECT * FROM orderhistory WHERE transaction_id = ?', (transaction_id,))
-        existing_transaction = cursor.fetchone()
+        # Check if the transaction exists in the orderhistory table, then in each attached archive
+        cursor = conn.cursor()
+        for schema in ['main'] + _archive_schemas(conn):
+            cursor.execute(f'SELECT product_id, transaction_date, cost, quantity FROM {schema}.orderhistory '
+                           f'WHERE transaction_id = ?', (transaction_id,))
+            existing_transaction = cursor.fetchone()
+            if existing_transaction is not None:
+                break
 
         if existing_transaction is None:
             return {"message": "Transaction not found"}
 
         # Delete the transaction from the orderhistory table
-        cursor.execute('DELETE FROM orderhistory WHERE transaction_id = ?', (transaction_id,))
+        cursor.execute(f'DELETE FROM {schema}.orderhistory WHERE transaction_id = ?', (transaction_id,))
+        if schema != 'main':
+            # The rollup triggers only watch the hot table, so take archived orders out of sales_daily here
+            product_id, transaction_date, cost, quantity = existing_transaction
+            cursor.execute('''
+                UPDATE sales_daily SET orders = orders - 1, units = units - ?, revenue = revenue - ?
+                WHERE product_id = ? AND day = date(?)''', (quantity, cost, product_id, transaction_date))
+            cursor.execute('DELETE FROM sales_daily WHERE product_id = ? AND day = date(?) AND orders <= 0',
+                           (product_id, transaction_date))
         conn.commit()
 
         return {"message": f"Transaction {transaction_id} voided"}
 
     except sqlite3.Error as e:
+        conn.rollback()
         return {"message": f"Error: {e}"}
 
 
-def display_transaction_table():
+@instrumented
+@_reporting(errors=True)
+def display_transaction_table(conn):
     # display the transaction table
 
     try:
         # Execute a SELECT query to retrieve all entries from the orderhistory table
+        cursor = conn.cursor()
         cursor.execute('SELECT * FROM orderhistory')
         transactions = cursor.fetchall()
 
@@ -223,8 +457,382 @@ def display_transaction_table():
         return {"message": f"Error: {e}"}
 
 
+@instrumented
+@_reporting(errors=True)
+def stream_transaction_table(conn, out, fmt: str = "text"):
+    # Writes the order history to out as text, csv, ndjson or pretty (see renderers.py)
+    try:
+        count = _stream_table(conn, "orderhistory", "transaction_id", out, fmt)
+        return {"message": f"Wrote {count} transaction(s)", "rows": count}
+
+    except sqlite3.Error as e:
+        return {"message": f"Error: {e}"}
+
+
+@instrumented
+def iter_transactions(conn, after_id: int = 0, limit: int = None, batch_size: int = 500):
+    # Yields orderhistory rows with transaction_id > after_id in id order, at most limit rows if given
+    # pass the last transaction_id seen as after_id to resume where a previous read stopped
+    cursor = conn.cursor()
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = batch_size if remaining is None else min(batch_size, remaining)
+        cursor.execute('''
+            SELECT transaction_id, product_id, transaction_date, cost, quantity
+            FROM orderhistory
+            WHERE transaction_id > ?
+            ORDER BY transaction_id
+            LIMIT ?''', (after_id, page_size))
+        rows = cursor.fetchmany(page_size)
+        if not rows:
+            return
+        yield from rows
+        after_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+ARCHIVE_SCHEMA_PREFIX = 'archive_'
+HISTORY_VIEW = 'orderhistory_all'
+
+
+def _archive_schemas(conn):
+    # Names of the attached archive partitions, oldest month first
+    return sorted(row[1] for row in conn.execute('PRAGMA database_list') if row[1].startswith(ARCHIVE_SCHEMA_PREFIX))
+
+
+def _history_source(conn):
+    # The hot orderhistory table, or the temp view spanning it and every attached archive partition
+    found = conn.execute("SELECT 1 FROM sqlite_temp_master WHERE type = 'view' AND name = ?", (HISTORY_VIEW,))
+    return HISTORY_VIEW if found.fetchone() else 'orderhistory'
+
+
+def _timestamp(value):
+    # Convert a date/datetime bound to the text format SQLite stores transaction_date in
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+@instrumented
+@_reporting
+def get_orders_between(conn, start, end):
+    # Returns every order with start <= transaction_date < end, oldest first
+    # start and end may be datetimes, dates or 'YYYY-MM-DD[ HH:MM:SS]' strings
+    # attached archive partitions (see archive.attach_archives) are searched too
+    cursor = conn.cursor()
+    source = _history_source(conn)
+    cursor.execute(f'''
+        SELECT transaction_id, product_id, transaction_date, cost, quantity
+        FROM {source}
+        WHERE transaction_date >= ? AND transaction_date < ?
+        ORDER BY transaction_date, transaction_id''', (_timestamp(start), _timestamp(end)))
+    return cursor.fetchall()
+
+
+@instrumented
+@_reporting
+def get_orders_for_product(conn, product_id: int, since=None):
+    # Returns the orders for one product, optionally only those at or after since, oldest first
+    cursor = conn.cursor()
+    source = _history_source(conn)
+    if since is None:
+        cursor.execute(f'''
+            SELECT transaction_id, product_id, transaction_date, cost, quantity
+            FROM {source}
+            WHERE product_id = ?
+            ORDER BY transaction_date, transaction_id''', (product_id,))
+    else:
+        cursor.execute(f'''
+            SELECT transaction_id, product_id, transaction_date, cost, quantity
+            FROM {source}
+            WHERE product_id = ? AND transaction_date >= ?
+            ORDER BY transaction_date, transaction_id''', (product_id, _timestamp(since)))
+    return cursor.fetchall()
+
+
+@instrumented
+@_reporting
+def sales_totals(conn, start, end):
+    # Returns (product_id, units, revenue) per product for orders with start <= transaction_date < end
+    # whole-day bounds are answered from the sales_daily rollup, anything finer from orderhistory
+    start_day, end_day = _day(start), _day(end)
+    cursor = conn.cursor()
+    if start_day is not None and end_day is not None:
+        cursor.execute('''
+            SELECT product_id, SUM(units), SUM(revenue)
+            FROM sales_daily
+            WHERE day >= ? AND day < ?
+            GROUP BY product_id
+            ORDER BY product_id''', (start_day, end_day))
+    else:
+        cursor.execute(f'''
+            SELECT product_id, SUM(quantity), SUM(cost)
+            FROM {_history_source(conn)}
+            WHERE transaction_date >= ? AND transaction_date < ?
+            GROUP BY product_id
+            ORDER BY product_id''', (_timestamp(start), _timestamp(end)))
+    return cursor.fetchall()
+
+
+def _day(value):
+    # The 'YYYY-MM-DD' day a bound falls on if it is at midnight, otherwise None
+    value = _timestamp(value)
+    if isinstance(value, str) and (len(value) == 10 or value[10:] in (' 00:00:00', 'T00:00:00')):
+        return value[:10]
+    return None
+
+
+@instrumented
+@_reporting
+def get_daily_sales(conn, start, end, product_id: int = None):
+    # Returns (product_id, day, units, revenue) rollup rows for start <= day < end, optionally for one product
+    cursor = conn.cursor()
+    if product_id is None:
+        cursor.execute('''
+            SELECT product_id, day, units, revenue
+            FROM sales_daily
+            WHERE day >= ? AND day < ?
+            ORDER BY day, product_id''', (str(_timestamp(start))[:10], str(_timestamp(end))[:10]))
+    else:
+        cursor.execute('''
+            SELECT product_id, day, units, revenue
+            FROM sales_daily
+            WHERE product_id = ? AND day >= ? AND day < ?
+            ORDER BY day''', (product_id, str(_timestamp(start))[:10], str(_timestamp(end))[:10]))
+    return cursor.fetchall()
+
+
+@instrumented
+def rebuild_sales_daily(conn):
+    # Recomputes the whole sales_daily rollup from orderhistory, for backfill or after bulk edits
+    # archived months are read through orderhistory_all, so every archive partition must be attached first
+    # (archive.attach_archives), or the rebuilt rollup loses the months that are not
+    try:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM sales_daily')
+        cursor.execute(f'''
+            INSERT INTO sales_daily (product_id, day, orders, units, revenue)
+            SELECT product_id, date(transaction_date), COUNT(*), SUM(quantity), SUM(cost)
+            FROM {_history_source(conn)}
+            WHERE product_id IS NOT NULL
+            GROUP BY product_id, date(transaction_date)''')
+        conn.commit()
+        return {"message": f"Rebuilt {cursor.rowcount} daily sales row(s)"}
+
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {"message": f"Error: {e}"}
+
+
 ###END OF TRANSACION OPERATIONS###
-'''
+
+###LOW STOCK###
+# Products with a reorder_threshold are tracked and are low on stock while quantity < reorder_threshold.
+# Every query here walks idx_inventory_stock_margin (see schema.py), which SQLite keeps current on every
+# quantity change, instead of scanning the inventory.
+LOW_STOCK_COLUMNS = 'id, product_name, quantity, reorder_threshold, restock_level'
+
+
+@instrumented
+def set_reorder_threshold(conn, product_id: int, threshold: int = None, restock_level: int = None):
+    # Sets when a product needs restocking and the quantity to restock it to (defaults to the threshold)
+    # a threshold of None stops tracking the product
+    if threshold is not None and threshold < 0:
+        return {"message": "Threshold must not be negative"}
+    if restock_level is not None and (threshold is None or restock_level < threshold):
+        return {"message": "Restock level must be at least the threshold"}
+
+    cursor = conn.cursor()
+    cursor.execute('UPDATE inventory SET reorder_threshold = ?, restock_level = ? WHERE id = ?',
+                   (threshold, restock_level, product_id))
+    conn.commit()
+
+    if cursor.rowcount == 0:
+        return {"message": "Product not found"}
+    return {"message": "Reorder threshold updated"}
+
+
+@instrumented
+def get_most_depleted(conn, limit: int = 10):
+    # The limit tracked products furthest below (or closest above) their threshold, most depleted first
+    # rows are (id, product_name, quantity, reorder_threshold, restock_level)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {LOW_STOCK_COLUMNS}
+        FROM inventory
+        WHERE reorder_threshold IS NOT NULL
+        ORDER BY quantity - reorder_threshold, id
+        LIMIT ?''', (limit,))
+    return cursor.fetchall()
+
+
+@instrumented
+def get_low_stock(conn):
+    # Every tracked product below its threshold, most depleted first
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {LOW_STOCK_COLUMNS}
+        FROM inventory
+        WHERE reorder_threshold IS NOT NULL AND quantity - reorder_threshold < 0
+        ORDER BY quantity - reorder_threshold, id''')
+    return cursor.fetchall()
+
+
+@instrumented
+def reorder_batches(conn, batch_size: int = ORDER_CHUNK_SIZE):
+    # Yields lists of (product_id, qty) lines that bring each low-stock product back up to its restock level,
+    # most depleted first, ready for order_many: for lines in reorder_batches(conn): order_many(conn, lines)
+    # pages are keyset reads on (margin, id), so ordering a batch before asking for the next one is safe
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, COALESCE(restock_level, reorder_threshold) - quantity, quantity - reorder_threshold
+        FROM inventory
+        WHERE reorder_threshold IS NOT NULL AND quantity - reorder_threshold < 0
+        ORDER BY quantity - reorder_threshold, id
+        LIMIT ?''', (batch_size,))
+    while True:
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield [(product_id, qty) for product_id, qty, _ in rows]
+        margin, last_id = rows[-1][2], rows[-1][0]
+        cursor.execute('''
+            SELECT id, COALESCE(restock_level, reorder_threshold) - quantity, quantity - reorder_threshold
+            FROM inventory
+            WHERE reorder_threshold IS NOT NULL AND quantity - reorder_threshold BETWEEN ? AND -1
+              AND (quantity - reorder_threshold, id) > (?, ?)
+            ORDER BY quantity - reorder_threshold, id
+            LIMIT ?''', (margin, margin, last_id, batch_size))
+
+
+###BULK PRICING###
+# Filterable columns for reprice; where maps a column to a value, a list/tuple/set of values, or None for NULL
+PRICING_FILTER_COLUMNS = ('id', 'product_name', 'product_company', 'price', 'quantity')
+VALUATION_GROUPS = ('product_company', 'product_name')
+
+
+def _where_clause(where):
+    # Builds "WHERE ..." and its parameters from a {column: value} filter, rejecting unknown columns
+    if not where:
+        return '', []
+    conditions = []
+    params = []
+    for column, value in where.items():
+        if column not in PRICING_FILTER_COLUMNS:
+            raise ValueError(f"Cannot filter on {column!r}; choose from {', '.join(PRICING_FILTER_COLUMNS)}")
+        if value is None:
+            conditions.append(f'{column} IS NULL')
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            values = list(value)
+            if not values:
+                conditions.append('0')
+            else:
+                conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params += values
+        else:
+            conditions.append(f'{column} = ?')
+            params.append(value)
+    return 'WHERE ' + ' AND '.join(conditions), params
+
+
+@instrumented
+def reprice(conn, where: dict = None, pct: float = 0, round_to: float = None):
+    # Changes the price of every product matching where (all products if None) by pct percent
+    # and optionally rounds the result to the nearest multiple of round_to (e.g. 0.05)
+    # runs as one UPDATE in one transaction, however many products match
+    if pct <= -100:
+        return {"message": "A price cut must be less than 100%"}
+    if round_to is not None and round_to <= 0:
+        return {"message": "round_to must be positive"}
+
+    clause, params = _where_clause(where)
+    new_price = 'price * (1 + ? / 100.0)'
+    price_params = [pct]
+    if round_to is not None:
+        # Round to the multiple, but never down to 0, then to cents to clear float noise
+        new_price = f'ROUND(MAX(ROUND({new_price} / ?), 1) * ?, 2)'
+        price_params += [round_to, round_to]
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'UPDATE inventory SET price = {new_price} {clause}', price_params + params)
+        conn.commit()
+        return {"message": f"Repriced {cursor.rowcount} product(s)", "repriced": cursor.rowcount}
+
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {"message": f"Error: {e}"}
+
+
+@instrumented
+@_reporting
+def inventory_valuation(conn, group_by: str = 'product_company'):
+    # Stock value (price * quantity) computed in SQL, as (group, products, units, value) rows ordered by group
+    # group_by is 'product_company', 'product_name' or None for a single total row (group None)
+    if group_by is not None and group_by not in VALUATION_GROUPS:
+        raise ValueError(f"Cannot group by {group_by!r}; choose from {', '.join(VALUATION_GROUPS)} or None")
+
+    cursor = conn.cursor()
+    if group_by is None:
+        cursor.execute('''
+            SELECT NULL, COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(price * quantity), 0)
+            FROM inventory''')
+    else:
+        cursor.execute(f'''
+            SELECT {group_by}, COUNT(*), SUM(quantity), SUM(price * quantity)
+            FROM inventory
+            GROUP BY {group_by}
+            ORDER BY {group_by}''')
+    return cursor.fetchall()
+
+
+
+###SEARCH###
+SEARCH_LIMIT = 20
+SEARCH_TABLE = 'inventory_search'
+SEARCH_WEIGHTS = (10.0, 1.0)  # bm25 weights: a match in the product name outranks one in the company
+_SEARCH_TERM = re.compile(r'\w+')
+
+
+@instrumented
+def search_products(conn, query: str, limit: int = SEARCH_LIMIT):
+    # Returns up to limit products whose name or company contains every word of query as a word prefix,
+    # best match first, as (id, product_name, price, product_company, quantity) rows like get_products
+    # uses the FTS5 index from schema.py; without FTS5 it falls back to a slower LIKE scan
+    terms = _SEARCH_TERM.findall(query or '')
+    if not terms or limit <= 0:
+        return []
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (SEARCH_TABLE,))
+    if cursor.fetchone():
+        # Quote every term so user input can never be read as FTS5 syntax, and make each one a prefix
+        match = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+        cursor.execute(f'''
+            SELECT inventory.id, inventory.product_name, inventory.price, inventory.product_company, inventory.quantity
+            FROM {SEARCH_TABLE}
+            JOIN inventory ON inventory.id = {SEARCH_TABLE}.rowid
+            WHERE {SEARCH_TABLE} MATCH ?
+            ORDER BY bm25({SEARCH_TABLE}, ?, ?)
+            LIMIT ?''', (match, *SEARCH_WEIGHTS, limit))
+        return cursor.fetchall()
+
+    # LIKE fallback: every term must appear in the name or company; names starting with the first term come first
+    # terms are word characters only, so '_' is the one LIKE wildcard that needs escaping
+    patterns = [term.replace('_', '\\_') for term in terms]
+    conditions = " AND ".join(["(product_name LIKE ? ESCAPE '\\' OR product_company LIKE ? ESCAPE '\\')"] * len(terms))
+    cursor.execute(f'''
+        SELECT id, product_name, price, product_company, quantity
+        FROM inventory
+        WHERE {conditions}
+        ORDER BY product_name LIKE ? ESCAPE '\\' DESC, product_name
+        LIMIT ?''', (*[f'%{pattern}%' for pattern in patterns for _ in range(2)], patterns[0] + '%', limit))
+    return cursor.fetchall()
+
+
 ###TESTING
 
 """
@@ -8,41 +8,29 @@ from pydantic import BaseModel
 from model import Product
 import sqlite3
 from prettytable import PrettyTable
+from dbpool import ConnectionManager
+from schema import ensure_schema
 
 DB_FILE = 'milkis.db'
 
-conn = sqlite3.connect(DB_FILE)
-cursor = conn.cursor()
-
-# Creating the inventory table in the database
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS inventory (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        product_name TEXT NOT NULL UNIQUE,
-        price REAL NOT NULL,
-        product_company TEXT DEFAULT NULL,
-        quantity INTEGER DEFAULT 0
-    )
-''')
-
-# Creating the Order History table in the database
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS orderhistory (
-    transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    product_id INTEGER,
-    transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    cost REAL NOT NULL,
-    quantity INTEGER NOT NULL,
-    FOREIGN KEY (product_id) REFERENCES inventory(id)
-)
-''')
-
-conn.commit()
+# Opened lazily: importing this module does not touch disk
+conn = ConnectionManager(DB_FILE)
+_schema_ready = False
+
+
+def _cursor():
+    # A cursor on this thread's connection, with the schema brought up to date on first use
+    global _schema_ready
+    if not _schema_ready:
+        ensure_schema(conn)
+        _schema_ready = True
+    return conn.cursor()
 
 
 ###INVENTORY TABLE OPERATIONS###
 def create_product(product: Product):
     # Creates a new unique product in the database
+    cursor = _cursor()
 
     cursor.execute('''
         INSERT INTO inventory (product_name, price, product_company, quantity)
@@ -53,6 +41,7 @@ def create_product(product: Product):
 
 def get_products():
     # Returns a list of all products in the database
+    cursor = _cursor()
 
     cursor.execute('SELECT id, product_name, price, product_company, quantity FROM inventory')
     products = cursor.fetchall()
@@ -61,6 +50,7 @@ def get_products():
 
 def get_product(product_id: int):
     # Function to return a single product with the product_id identifier
+    cursor = _cursor()
 
     cursor.execute('SELECT product_name, price FROM inventory WHERE id = ?', (product_id,))
     product = cursor.fetchone()
@@ -69,6 +59,7 @@ def get_product(product_id: int):
 
 def update_product(product_id: int, product: Product):
     # Pass a new product object to update the product at the location of the product id in the database
+    cursor = _cursor()
 
     cursor.execute('''
         UPDATE inventory
@@ -82,6 +73,7 @@ def update_product(product_id: int, product: Product):
 def add_quantity(item_name: str, quantity_to_add: int = 1):
     # modify the item in the database to add some integer quantity
     # wil mainly be used when putting in orders
+    cursor = _cursor()
 
     cursor.execute("UPDATE inventory SET quantity = quantity + ? WHERE product_name = ?", (quantity_to_add, item_name))
     conn.commit()
@@ -90,6 +82,7 @@ def add_quantity(item_name: str, quantity_to_add: int = 1):
 
 def delete_productID(product_id: int):
     # Delete a product by ID from the database
+    cursor = _cursor()
 
     cursor.execute('DELETE FROM inventory WHERE id = ?', (product_id,))
     conn.commit()
@@ -98,6 +91,7 @@ def delete_productID(product_id: int):
 
 def delete_productname(product_name: str):
     # Check if the product exists in the database
+    cursor = _cursor()
     cursor.execute('SELECT COUNT(*) FROM inventory WHERE product_name = ?', (product_name,))
     count = cursor.fetchone()[0]
 
@@ -113,10 +107,11 @@ def delete_productname(product_name: str):
 
 def display_inventory_table():
     # Display the entire inventory as a table
+    cursor = _cursor()
 
     try:
         # Execute a SELECT query to retrieve all entries from the inventory table
-        cursor.execute('SELECT * FROM inventory')
+        cursor.execute('SELECT id, product_name, price, product_company, quantity FROM inventory')
         products = cursor.fetchall()
 
         if not products:
@@ -145,6 +140,7 @@ def shutdown_event():
 ###TRANSACTION TABLE OPERATIONS###
 def order(product_id: int, qty: int):
     # orders a quantity of the product and creates an entry in the order history table
+    cursor = _cursor()
 
     try:
         # Find the product in the inventory and get its current quantity
@@ -179,6 +175,7 @@ def order(product_id: int, qty: int):
 
 def void_order(transaction_id: int):
     # Void an order by the transaction id
+    cursor = _cursor()
 
     try:
         # Check if the transaction exists in the orderhistory table
@@ -200,6 +197,7 @@ def void_order(transaction_id: int):
 
 def display_transaction_table():
     # display the transaction table
+    cursor = _cursor()
 
     try:
         # Execute a SELECT query to retrieve all entries from the orderhistory table
@@ -226,26 +224,27 @@ def display_transaction_table():
 
 ###TESTING
 
-product = Product.create_basic(product_name="candy", price=0.99)
-product2 = Product.create_basic(product_name="chips", price=1.99)
+if __name__ == '__main__':
+    product = Product.create_basic(product_name="candy", price=0.99)
+    product2 = Product.create_basic(product_name="chips", price=1.99)
 
-print(get_products())
+    print(get_products())
 
-order(3, 30)
+    order(3, 30)
 
-# Example usage:
-inventory = display_inventory_table()
-if "table" in inventory:
-    print(inventory["message"])
-    print(inventory["table"])
-else:
-    print(inventory["message"])
+    # Example usage:
+    inventory = display_inventory_table()
+    if "table" in inventory:
+        print(inventory["message"])
+        print(inventory["table"])
+    else:
+        print(inventory["message"])
 
-result = display_transaction_table()
-if "table" in result:
-    print(result["message"])
-    print(result["table"])
-else:
-    print(result["message"])
+    result = display_transaction_table()
+    if "table" in result:
+        print(result["message"])
+        print(result["table"])
+    else:
+        print(result["message"])
 
-shutdown_event()
\ No newline at end of file
+    shutdown_event()
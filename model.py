@@ -1,11 +1,13 @@
-from pydantic import BaseModel, validator
+from typing import NamedTuple
+from pydantic import BaseModel
+
 
 class Product(BaseModel):
     product_name: str
     price: float
     product_company: str = ''
     quantity: int = 0
-    slot: str = ''
+    slot: str = ''  # validated by the machine's slotgrid.SlotGrid, which can be any size, not here
 
 
     @classmethod
@@ -22,9 +24,28 @@ class Product(BaseModel):
         """
         return cls(product_name=product_name, price=price, quantity=quantity)
 
-    @validator("slot")
-    def validate_slot(cls, value):
-        allowed_slots = ["a1", "a2", "a3", "b1", "b2", "b3", "c1", "c2", "c3"]
-        if value is not None and value not in allowed_slots:
-            raise ValueError("Invalid slot. Allowed slots are: a1, a2, a3, b1, b2, b3, c1, c2, c3")
-        return value
+    @classmethod
+    def from_row(cls, row):
+        """
+        Create a Product from a trusted inventory row (id, product_name, price, product_company, quantity)
+        without running validation. Only use this for rows read back from the database.
+        """
+        construct = getattr(cls, "model_construct", None) or cls.construct
+        return construct(product_name=row[1], price=row[2], product_company=row[3] or '', quantity=row[4])
+
+
+class ProductView(NamedTuple):
+    """
+    A compact, read-only inventory row for bulk listings. Build one with ProductView._make(row).
+    """
+    id: int
+    product_name: str
+    price: float
+    product_company: str
+    quantity: int
+
+    def to_product(self):
+        """
+        Create a full Product from this row.
+        """
+        return Product.from_row(self)
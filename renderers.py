@@ -0,0 +1,123 @@
+"""
+MILKIS REPORT RENDERERS
+
+Streams query results from a cursor straight to a writer, in constant memory:
+  text   - aligned columns, widths sized from a sampled prefix of the rows
+  csv    - RFC 4180 CSV with a header row
+  ndjson - one JSON object per line
+  pretty - a PrettyTable; buffers every row, so keep it for small outputs
+More formats can be added with register_renderer.
+"""
+
+import csv
+import itertools
+import json
+from prettytable import PrettyTable
+
+FETCH_SIZE = 1000
+SAMPLE_SIZE = 200
+
+
+def _rows(cursor, fetch_size: int = FETCH_SIZE):
+    # Yield rows from a cursor fetchmany batch at a time, or from any other iterable of rows
+    if not hasattr(cursor, "fetchmany"):
+        yield from cursor
+        return
+    while True:
+        batch = cursor.fetchmany(fetch_size)
+        if not batch:
+            return
+        yield from batch
+
+
+def _format_value(value):
+    return "" if value is None else str(value)
+
+
+def render_text(rows, out, columns, sample_size: int = SAMPLE_SIZE):
+    # Column widths come from the header and the first sample_size rows; a longer value later on
+    # is written in full and only pushes that one line out of alignment
+    sample = list(itertools.islice(rows, sample_size))
+    widths = [len(column) for column in columns]
+    for row in sample:
+        for i, value in enumerate(row):
+            widths[i] = max(widths[i], len(_format_value(value)))
+
+    def line(values):
+        return "  ".join(_format_value(value).ljust(width) for value, width in zip(values, widths)).rstrip() + "\n"
+
+    out.write(line(columns))
+    out.write("  ".join("-" * width for width in widths) + "\n")
+    count = 0
+    for row in itertools.chain(sample, rows):
+        out.write(line(row))
+        count += 1
+    return count
+
+
+def render_csv(rows, out, columns, sample_size: int = SAMPLE_SIZE):
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def render_ndjson(rows, out, columns, sample_size: int = SAMPLE_SIZE):
+    count = 0
+    for row in rows:
+        out.write(json.dumps(dict(zip(columns, row))))
+        out.write("\n")
+        count += 1
+    return count
+
+
+def render_pretty(rows, out, columns, sample_size: int = SAMPLE_SIZE):
+    table = PrettyTable()
+    table.field_names = columns
+    count = 0
+    for row in rows:
+        table.add_row(row)
+        count += 1
+    out.write(table.get_string())
+    out.write("\n")
+    return count
+
+
+RENDERERS = {
+    "text": render_text,
+    "csv": render_csv,
+    "ndjson": render_ndjson,
+    "pretty": render_pretty,
+}
+
+
+def register_renderer(name: str, renderer):
+    """
+    Add or replace a format. renderer(rows, out, columns, sample_size) writes the rows and returns how many it wrote.
+    """
+    RENDERERS[name] = renderer
+
+
+def render(cursor, out, fmt: str = "text", columns=None, sample_size: int = SAMPLE_SIZE):
+    """
+    Write every row of an executed cursor (or any iterable of rows) to out.
+
+    Args:
+        cursor: An executed sqlite3 cursor, or an iterable of row tuples.
+        out: Anything with a write(str) method, e.g. an open file or sys.stdout.
+        fmt (str): One of RENDERERS.
+        columns (list): Column headers; defaults to the cursor's column names.
+        sample_size (int): Rows the text format sizes its columns from.
+
+    Returns:
+        int: The number of rows written.
+    """
+    renderer = RENDERERS.get(fmt)
+    if renderer is None:
+        raise ValueError(f"Unknown format {fmt!r}; choose from {', '.join(RENDERERS)}")
+    if columns is None:
+        columns = [description[0] for description in cursor.description]
+    return renderer(_rows(cursor), out, list(columns), sample_size)
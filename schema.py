@@ -0,0 +1,202 @@
+"""
+MILKIS SCHEMA
+
+Versioned schema for the milkis database. The version lives in PRAGMA user_version;
+ensure_schema runs only the migrations a database is behind on, so an up-to-date database
+costs a single pragma read. Nothing here touches disk until ensure_schema is called.
+"""
+
+import sqlite3
+
+# Trigger bodies adding a history row to, or taking it out of, its sales_daily entry
+_ROLLUP_ADD = '''
+        INSERT INTO sales_daily (product_id, day, orders, units, revenue)
+        SELECT {row}.product_id, date({row}.transaction_date), 1, {row}.quantity, {row}.cost
+        WHERE {row}.product_id IS NOT NULL
+        ON CONFLICT (product_id, day) DO UPDATE SET
+            orders = orders + 1,
+            units = units + excluded.units,
+            revenue = revenue + excluded.revenue;'''
+_ROLLUP_SUBTRACT = '''
+        UPDATE sales_daily
+        SET orders = orders - 1, units = units - {row}.quantity, revenue = revenue - {row}.cost
+        WHERE product_id = {row}.product_id AND day = date({row}.transaction_date);
+        DELETE FROM sales_daily
+        WHERE product_id = {row}.product_id AND day = date({row}.transaction_date) AND orders <= 0;'''
+
+
+def _create_tables(cursor):
+    # Creating the inventory table in the database
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_name TEXT NOT NULL UNIQUE,
+            price REAL NOT NULL,
+            product_company TEXT DEFAULT NULL,
+            quantity INTEGER DEFAULT 0
+        )
+    ''')
+
+    # Creating the Order History table in the database
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS orderhistory (
+        transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id INTEGER,
+        transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        cost REAL NOT NULL,
+        quantity INTEGER NOT NULL,
+        FOREIGN KEY (product_id) REFERENCES inventory(id)
+    )
+    ''')
+
+
+def _create_history_indexes(cursor):
+    # Indexes for the per-product and time-range order history queries
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orderhistory_product_date ON orderhistory (product_id, transaction_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orderhistory_date ON orderhistory (transaction_date)')
+
+
+def _create_sales_rollup(cursor):
+    # Daily sales rollup, kept current by triggers on every orderhistory insert, void (delete) and update
+    # orders counts the history rows behind each entry so an entry disappears when its last order is voided
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sales_daily (
+        product_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        orders INTEGER NOT NULL DEFAULT 0,
+        units INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (product_id, day)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_daily_day ON sales_daily (day)')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS orderhistory_rollup_insert AFTER INSERT ON orderhistory
+    WHEN NEW.product_id IS NOT NULL
+    BEGIN
+        {_ROLLUP_ADD.format(row='NEW')}
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS orderhistory_rollup_delete AFTER DELETE ON orderhistory
+    WHEN OLD.product_id IS NOT NULL
+    BEGIN
+        {_ROLLUP_SUBTRACT.format(row='OLD')}
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS orderhistory_rollup_update
+    AFTER UPDATE OF product_id, transaction_date, cost, quantity ON orderhistory
+    BEGIN
+        {_ROLLUP_SUBTRACT.format(row='OLD')}
+        {_ROLLUP_ADD.format(row='NEW')}
+    END
+    ''')
+
+    # Backfill from the history already there, replacing anything an older setUpDB left behind
+    cursor.execute('DELETE FROM sales_daily')
+    cursor.execute('''
+        INSERT INTO sales_daily (product_id, day, orders, units, revenue)
+        SELECT product_id, date(transaction_date), COUNT(*), SUM(quantity), SUM(cost)
+        FROM orderhistory
+        WHERE product_id IS NOT NULL
+        GROUP BY product_id, date(transaction_date)''')
+
+
+def _add_reorder_thresholds(cursor):
+    # Per-product reorder threshold and restock level (NULL = not tracked), and a partial expression index
+    # on how far each tracked product is above (positive) or below (negative) its threshold.
+    # SQLite keeps the index current on every quantity change, so low-stock queries never scan the table
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(inventory)').fetchall()}
+    if 'reorder_threshold' not in columns:
+        cursor.execute('ALTER TABLE inventory ADD COLUMN reorder_threshold INTEGER DEFAULT NULL')
+    if 'restock_level' not in columns:
+        cursor.execute('ALTER TABLE inventory ADD COLUMN restock_level INTEGER DEFAULT NULL')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_inventory_stock_margin ON inventory (quantity - reorder_threshold)
+        WHERE reorder_threshold IS NOT NULL''')
+
+
+def _create_product_search(cursor):
+    # FTS5 index over product names and companies, with prefix indexes for search-as-you-type.
+    # It is external-content (rows live only in inventory) and kept in sync by triggers.
+    # SQLite builds without FTS5 skip it; milkdb.search_products then falls back to LIKE
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS inventory_search USING fts5(
+                product_name, product_company,
+                content='inventory', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )''')
+    except sqlite3.OperationalError as e:
+        if 'fts5' not in str(e):
+            raise
+        return
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_search_insert AFTER INSERT ON inventory
+    BEGIN
+        INSERT INTO inventory_search (rowid, product_name, product_company)
+        VALUES (NEW.id, NEW.product_name, NEW.product_company);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_search_delete AFTER DELETE ON inventory
+    BEGIN
+        INSERT INTO inventory_search (inventory_search, rowid, product_name, product_company)
+        VALUES ('delete', OLD.id, OLD.product_name, OLD.product_company);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_search_update AFTER UPDATE OF product_name, product_company ON inventory
+    BEGIN
+        INSERT INTO inventory_search (inventory_search, rowid, product_name, product_company)
+        VALUES ('delete', OLD.id, OLD.product_name, OLD.product_company);
+        INSERT INTO inventory_search (rowid, product_name, product_company)
+        VALUES (NEW.id, NEW.product_name, NEW.product_company);
+    END
+    ''')
+    # Index the products already there
+    cursor.execute("INSERT INTO inventory_search (inventory_search) VALUES ('rebuild')")
+
+
+# (version, migration) in order; a migration must be safe on databases created before versioning,
+# which already have some of its objects
+MIGRATIONS = [
+    (1, _create_tables),
+    (2, _create_history_indexes),
+    (3, _create_sales_rollup),
+    (4, _add_reorder_thresholds),
+    (5, _create_product_search),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    # The schema version recorded in the database, 0 for a new or pre-versioning database
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def ensure_schema(conn):
+    # Brings the database on conn up to SCHEMA_VERSION and returns the versions that were applied
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return []
+
+    if conn.in_transaction:
+        conn.commit()
+    cursor = conn.cursor()
+    # Take the write lock first and re-read the version, so concurrent starters migrate only once
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        current = schema_version(conn)
+        applied = []
+        for version, migrate in MIGRATIONS:
+            if version > current:
+                migrate(cursor)
+                applied.append(version)
+        if applied:
+            cursor.execute(f'PRAGMA user_version = {applied[-1]}')
+        conn.commit()
+        return applied
+    except Exception:
+        conn.rollback()
+        raise
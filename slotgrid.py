@@ -0,0 +1,124 @@
+"""
+MILKIS SLOT GRIDS
+
+A SlotGrid describes the slot layout of one machine model: rows labelled a, b, c, ... and columns
+numbered from 1, so a 3 x 3 grid has the slots a1 ... c3. Every slot code maps to a compact index
+(row * columns + column) so a machine can keep its slots in a fixed-size array.
+"""
+
+from collections.abc import Mapping
+from string import ascii_lowercase
+
+
+def _row_labels(rows: int):
+    # a ... z, then aa, ab, ... for grids taller than the alphabet
+    labels = []
+    for index in range(rows):
+        label = ''
+        index += 1
+        while index:
+            index, remainder = divmod(index - 1, 26)
+            label = ascii_lowercase[remainder] + label
+        labels.append(label)
+    return labels
+
+
+class SlotGrid:
+    def __init__(self, rows: int, columns: int):
+        """
+        Args:
+            rows (int): Number of rows, labelled a, b, c, ...
+            columns (int): Number of columns, numbered from 1.
+        """
+        if rows < 1 or columns < 1:
+            raise ValueError("A slot grid needs at least one row and one column")
+        self.rows = rows
+        self.columns = columns
+        self.codes = tuple(f"{row}{column}" for row in _row_labels(rows) for column in range(1, columns + 1))
+        self._indexes = {code: index for index, code in enumerate(self.codes)}
+
+    def index(self, code: str):
+        """
+        Returns:
+            int: The array index of a slot code.
+
+        Raises:
+            ValueError: If the code is not a slot in this grid.
+        """
+        try:
+            return self._indexes[code]
+        except (KeyError, TypeError):
+            raise ValueError(f"Invalid slot {code!r}. Allowed slots are: {self.describe()}") from None
+
+    def lookup(self, code: str):
+        """
+        Returns:
+            int or None: The array index of a slot code, or None if the code is not in this grid.
+        """
+        return self._indexes.get(code) if isinstance(code, str) else None
+
+    def code(self, index: int):
+        """
+        Returns:
+            str: The slot code at an array index.
+        """
+        return self.codes[index]
+
+    def describe(self):
+        # Short human-readable list of the slots, for error messages
+        if len(self.codes) <= 12:
+            return ", ".join(self.codes)
+        return f"{self.codes[0]}-{self.codes[-1]} ({self.rows} rows x {self.columns} columns)"
+
+    def __contains__(self, code):
+        return code in self._indexes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return iter(self.codes)
+
+    def __eq__(self, other):
+        return isinstance(other, SlotGrid) and (self.rows, self.columns) == (other.rows, other.columns)
+
+    def __hash__(self):
+        return hash((self.rows, self.columns))
+
+    def __repr__(self):
+        return f"SlotGrid({self.rows}, {self.columns})"
+
+
+DEFAULT_GRID = SlotGrid(3, 3)
+
+
+class SlotView(Mapping):
+    """
+    A read-only, dict-like view of a slot array: slot code -> item for every filled slot, in slot order.
+    """
+
+    def __init__(self, grid: SlotGrid, items, empty=None):
+        self._grid = grid
+        self._items = items
+        self._empty = empty
+
+    def __getitem__(self, code):
+        index = self._grid.lookup(code)
+        if index is None:
+            raise KeyError(code)
+        item = self._items[index]
+        if item == self._empty:
+            raise KeyError(code)
+        return item
+
+    def __iter__(self):
+        empty = self._empty
+        codes = self._grid.codes
+        return (codes[index] for index, item in enumerate(self._items) if item != empty)
+
+    def __len__(self):
+        empty = self._empty
+        return sum(1 for item in self._items if item != empty)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
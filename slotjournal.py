@@ -0,0 +1,186 @@
+"""
+MILKIS SLOT JOURNAL
+
+Persists the slot state of one VendingMachine without the products database:
+  <path>.journal   append-only binary log of slot mutations since the last snapshot
+  <path>.snapshot  compact image of every filled slot, replaced atomically
+A restarting machine reads the snapshot and replays the journal tail on top of it. Each record
+stores the whole product, so nothing has to be looked up again, and carries a CRC32 so a record
+torn by a crash is detected and cut off rather than replayed. Replaying is idempotent, so a
+crash between writing a snapshot and resetting the journal loses nothing.
+"""
+
+import os
+import struct
+import zlib
+from model import Product
+from slotgrid import DEFAULT_GRID
+
+SNAPSHOT_EVERY = 1000  # journal records between automatic snapshots
+
+_JOURNAL_MAGIC = b'MKJ1'
+_SNAPSHOT_MAGIC = b'MKS1'
+_HEADER = struct.Struct('<4sHH')  # magic, grid rows, grid columns
+_RECORD = struct.Struct('<IHI')  # crc32 of the rest, slot index, payload length (0 = slot emptied)
+_ENTRY = struct.Struct('<HI')  # snapshot entry: slot index, payload length
+_COUNT = struct.Struct('<I')
+_PRODUCT = struct.Struct('<dqHH')  # price, quantity, name length, company length, then the two strings
+
+
+def _encode(product):
+    name = product.product_name.encode('utf-8')
+    company = (product.product_company or '').encode('utf-8')
+    return _PRODUCT.pack(product.price, product.quantity, len(name), len(company)) + name + company
+
+
+def _decode(payload, products):
+    # products caches the Product built for each payload, as building one is the slow part of a restore
+    product = products.get(payload)
+    if product is not None:
+        return product
+    price, quantity, name_length, company_length = _PRODUCT.unpack_from(payload)
+    start = _PRODUCT.size
+    name = payload[start:start + name_length].decode('utf-8')
+    company = payload[start + name_length:start + name_length + company_length].decode('utf-8')
+    product = products[payload] = Product.from_row((None, name, price, company, quantity))
+    return product
+
+
+def _record(index, product):
+    payload = b'' if product is None else _encode(product)
+    body = struct.pack('<HI', index, len(payload)) + payload
+    return struct.pack('<I', zlib.crc32(body)) + body
+
+
+class SlotJournal:
+    def __init__(self, path: str, grid=DEFAULT_GRID, snapshot_every: int = SNAPSHOT_EVERY, fsync: bool = False,
+                 products: dict = None):
+        """
+        Args:
+            path (str): Base path; the journal and snapshot are written next to it with their own suffixes.
+            grid (SlotGrid): The machine's slot layout; restoring state written for another grid fails.
+            snapshot_every (int): Journal records after which the machine writes a snapshot.
+            fsync (bool): Force every write to disk. Without it a crash of the host, but not of the process,
+                can lose the most recent mutations.
+            products (dict): Decode cache to share between the journals of one node, so a product stocked in
+                many slots or machines is rebuilt once. Restored slots then share Product objects, as in fleet.Fleet.
+        """
+        self.journal_path = path + '.journal'
+        self.snapshot_path = path + '.snapshot'
+        self.grid = grid
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.pending = 0  # records in the journal since the last snapshot
+        self.products = products
+
+    ###RESTORE###
+    def restore(self):
+        """
+        Rebuild the slot array from the snapshot and the journal tail, cutting off a torn last record.
+
+        Returns:
+            list: One Product or None per slot, in grid order.
+
+        Raises:
+            ValueError: If the files were written for a different grid or are not slot journal files.
+        """
+        slots = [None] * len(self.grid)
+        products = self.products if self.products is not None else {}
+        if os.path.exists(self.snapshot_path):
+            self._read_snapshot(slots, products)
+        self.pending = 0
+        if os.path.exists(self.journal_path):
+            self._replay(slots, products)
+        return slots
+
+    def _check_header(self, data, magic, path):
+        if len(data) < _HEADER.size:
+            raise ValueError(f"{path} is not a slot journal file")
+        file_magic, rows, columns = _HEADER.unpack_from(data)
+        if file_magic != magic:
+            raise ValueError(f"{path} is not a slot journal file")
+        if (rows, columns) != (self.grid.rows, self.grid.columns):
+            raise ValueError(f"{path} was written for a {rows} x {columns} grid, not {self.grid!r}")
+
+    def _read_snapshot(self, slots, products):
+        with open(self.snapshot_path, 'rb') as f:
+            data = f.read()
+        self._check_header(data, _SNAPSHOT_MAGIC, self.snapshot_path)
+        if len(data) < _HEADER.size + 2 * _COUNT.size or \
+                zlib.crc32(data[:-_COUNT.size]) != _COUNT.unpack_from(data, len(data) - _COUNT.size)[0]:
+            raise ValueError(f"{self.snapshot_path} is corrupt")
+
+        offset = _HEADER.size
+        count, = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        for _ in range(count):
+            index, length = _ENTRY.unpack_from(data, offset)
+            offset += _ENTRY.size
+            slots[index] = _decode(data[offset:offset + length], products)
+            offset += length
+
+    def _replay(self, slots, products):
+        with open(self.journal_path, 'rb') as f:
+            data = f.read()
+        if len(data) < _HEADER.size:
+            offset = 0  # nothing, or a header torn on the very first write
+        else:
+            self._check_header(data, _JOURNAL_MAGIC, self.journal_path)
+            offset = _HEADER.size
+        while offset + _RECORD.size <= len(data):
+            crc, index, length = _RECORD.unpack_from(data, offset)
+            end = offset + _RECORD.size + length
+            if end > len(data) or zlib.crc32(data[offset + 4:end]) != crc or index >= len(slots):
+                break
+            slots[index] = _decode(data[offset + _RECORD.size:end], products) if length else None
+            self.pending += 1
+            offset = end
+
+        if offset < len(data):
+            # A crash tore the last write: drop it so new records are appended after the last good one
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(offset)
+
+    ###WRITE###
+    def append(self, mutations):
+        """
+        Log slot changes, in order, with a single write.
+
+        Args:
+            mutations: (slot index, Product or None) pairs; None empties the slot.
+        """
+        mutations = list(mutations)
+        if not mutations:
+            return
+        data = b''.join(_record(index, product) for index, product in mutations)
+        if not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0:
+            data = _HEADER.pack(_JOURNAL_MAGIC, self.grid.rows, self.grid.columns) + data
+        self._write(self.journal_path, data, 'ab')
+        self.pending += len(mutations)
+
+    def needs_snapshot(self):
+        return self.pending >= self.snapshot_every
+
+    def snapshot(self, slots):
+        """
+        Write every filled slot to a new snapshot, then start an empty journal.
+        """
+        entries = [(index, _encode(product)) for index, product in enumerate(slots) if product is not None]
+        data = _HEADER.pack(_SNAPSHOT_MAGIC, self.grid.rows, self.grid.columns) + _COUNT.pack(len(entries))
+        data += b''.join(_ENTRY.pack(index, len(payload)) + payload for index, payload in entries)
+        data += _COUNT.pack(zlib.crc32(data))
+
+        # Replace the snapshot atomically, then reset the journal. A crash in between only means
+        # the old journal is replayed over the new snapshot, which gives the same slots
+        temp_path = self.snapshot_path + '.tmp'
+        self._write(temp_path, data, 'wb')
+        os.replace(temp_path, self.snapshot_path)
+        self._write(self.journal_path, _HEADER.pack(_JOURNAL_MAGIC, self.grid.rows, self.grid.columns), 'wb')
+        self.pending = 0
+
+    def _write(self, path, data, mode):
+        with open(path, mode) as f:
+            f.write(data)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
@@ -0,0 +1,116 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+from model import Product
+from dbpool import ConnectionManager
+from milkdb import (setUpDB, create_product, get_products, get_orders_between, get_orders_for_product,
+                    sales_totals, void_order, rebuild_sales_daily)
+from archive import archive_month, attach_archives, detach_archives, archive_path
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.archive_dir = os.path.join(self.tmpdir.name, 'archive')
+        self.conn = setUpDB(sqlite3.connect(os.path.join(self.tmpdir.name, 'hot.db')))
+        create_product(Product(product_name="Tea", price=2.00), self.conn)
+        self.tea_id = get_products(self.conn)[0][0]
+        self.conn.executemany(
+            "INSERT INTO orderhistory (product_id, transaction_date, cost, quantity) VALUES (?, ?, ?, ?)",
+            [(self.tea_id, '2023-01-15 10:00:00', 2.00, 1),
+             (self.tea_id, '2023-01-31 23:59:59', 4.00, 2),
+             (self.tea_id, '2023-02-01 00:00:00', 6.00, 3)])
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def hot_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM main.orderhistory").fetchone()[0]
+
+    def test_archive_month_moves_rows(self):
+        result = archive_month(self.conn, '2023-01', self.archive_dir, keep_attached=True)
+
+        self.assertEqual(result["archived"], 2)
+        self.assertEqual(self.hot_count(), 1)
+        self.assertTrue(os.path.exists(archive_path(self.archive_dir, '2023-01')))
+        # Archived rows are still found, and the rollup is unchanged
+        self.assertEqual(len(get_orders_between(self.conn, '2023-01-01', '2023-03-01')), 3)
+        self.assertEqual(len(get_orders_for_product(self.conn, self.tea_id, since='2023-01-20')), 2)
+        self.assertEqual(sales_totals(self.conn, '2023-01-01', '2023-02-01'), [(self.tea_id, 3, 6.00)])
+        self.assertEqual(sales_totals(self.conn, '2023-01-10 00:00:01', '2023-02-01'), [(self.tea_id, 3, 6.00)])
+
+        # Running it again does not duplicate anything
+        self.assertEqual(archive_month(self.conn, '2023-01', self.archive_dir, keep_attached=True)["archived"], 0)
+        self.assertEqual(len(get_orders_between(self.conn, '2023-01-01', '2023-02-01')), 2)
+
+    def test_void_archived_order(self):
+        archive_month(self.conn, '2023-01', self.archive_dir, keep_attached=True)
+        transaction_id = get_orders_between(self.conn, '2023-01-01', '2023-01-16')[0][0]
+
+        self.assertEqual(void_order(self.conn, transaction_id), {"message": f"Transaction {transaction_id} voided"})
+        self.assertEqual(sales_totals(self.conn, '2023-01-01', '2023-02-01'), [(self.tea_id, 2, 4.00)])
+
+    def test_rebuild_keeps_archived_months(self):
+        archive_month(self.conn, '2023-01', self.archive_dir, keep_attached=True)
+
+        self.assertEqual(rebuild_sales_daily(self.conn), {"message": "Rebuilt 3 daily sales row(s)"})
+        self.assertEqual(sales_totals(self.conn, '2023-01-01', '2023-03-01'), [(self.tea_id, 6, 12.00)])
+
+    def test_attach_from_new_connection(self):
+        archive_month(self.conn, '2023-01', self.archive_dir)
+        manager = ConnectionManager(self.conn.execute("PRAGMA database_list").fetchone()[2])
+        try:
+            self.assertEqual(len(get_orders_between(manager, '2023-01-01', '2023-03-01')), 1)
+            self.assertEqual(attach_archives(manager, self.archive_dir), ['archive_2023_01'])
+            self.assertEqual(len(get_orders_between(manager, '2023-01-01', '2023-03-01')), 3)
+            detach_archives(manager)
+            self.assertEqual(len(get_orders_between(manager, '2023-01-01', '2023-03-01')), 1)
+        finally:
+            manager.close()
+
+    def test_archive_month_on_connection_manager(self):
+        manager = ConnectionManager(self.conn.execute("PRAGMA database_list").fetchone()[2])
+        try:
+            self.assertEqual(archive_month(manager, '2023-01', self.archive_dir, keep_attached=True)["archived"], 2)
+            # Reports run on the manager's reader connection, which attaches the new partition too
+            self.assertEqual(len(get_orders_between(manager, '2023-01-01', '2023-03-01')), 3)
+            self.assertEqual(sales_totals(manager, '2023-01-10 00:00:01', '2023-02-01'), [(self.tea_id, 3, 6.00)])
+            detach_archives(manager)
+            self.assertEqual(len(get_orders_between(manager, '2023-01-01', '2023-03-01')), 1)
+        finally:
+            manager.close()
+
+    def test_backfill_more_months_than_attach_limit(self):
+        self.conn.executemany(
+            "INSERT INTO orderhistory (product_id, transaction_date, cost, quantity) VALUES (?, ?, 2.00, 1)",
+            [(self.tea_id, f'2022-{month:02d}-10 12:00:00') for month in range(1, 13)])
+        self.conn.commit()
+
+        # Each partition is detached after its move, so a year of history fits however low the limit
+        for month in range(1, 13):
+            self.assertEqual(archive_month(self.conn, f'2022-{month:02d}', self.archive_dir)["archived"], 1)
+        self.assertEqual(self.conn.execute("PRAGMA database_list").fetchall()[1:], [])
+        self.assertEqual(sales_totals(self.conn, '2022-01-01', '2023-01-01'), [(self.tea_id, 12, 24.00)])
+
+        # Twelve files cannot all be attached: nothing is attached and the manager keeps working
+        manager = ConnectionManager(self.conn.execute("PRAGMA database_list").fetchone()[2])
+        try:
+            self.assertTrue(attach_archives(manager, self.archive_dir)["message"].startswith("Error"))
+            self.assertEqual(len(get_orders_between(manager, '2023-01-01', '2023-03-01')), 3)
+            self.assertEqual(attach_archives(manager, self.archive_dir, since='2022-07'),
+                             [f'archive_2022_{month:02d}' for month in range(7, 13)])
+            self.assertEqual(len(get_orders_between(manager, '2022-01-01', '2023-03-01')), 9)
+        finally:
+            manager.close()
+
+    def test_open_month_is_refused(self):
+        self.assertIn("not closed", archive_month(self.conn, '9999-01', self.archive_dir)["message"])
+        with self.assertRaises(ValueError):
+            archive_month(self.conn, '2023-13', self.archive_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import threading
+import milkdb
+from model import Product
+from dbpool import ConnectionManager
+from milkdb import setUpDB
+from asyncvending import AsyncMilkDB, AsyncVendingMachine
+
+
+class TestAsyncMilkDB(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        manager = setUpDB(ConnectionManager(os.path.join(self.tmpdir.name, 'async.db')))
+        self.db = AsyncMilkDB(manager, max_workers=2, max_pending=8)
+        await self.db.create_product(Product(product_name="Gum", price=0.50, quantity=3))
+        self.gum_id = (await self.db.get_products())[0][0]
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        self.tmpdir.cleanup()
+
+    async def test_reads_and_writes(self):
+        await self.db.add_quantity("Gum", 2)
+        await self.db.order(self.gum_id, 5)
+
+        self.assertEqual(await self.db.get_product(self.gum_id), ("Gum", 0.50))
+        self.assertEqual((await self.db.get_products())[0][4], 10)
+        self.assertEqual(len(await self.db.get_orders_for_product(self.gum_id)), 1)
+        self.assertEqual([row[0] async for row in self.db.iter_products(batch_size=1)], [self.gum_id])
+
+        for _ in range(4):
+            await self.db.order(self.gum_id, 1)
+        ids = [row[0] async for row in self.db.iter_transactions(batch_size=2)]
+        self.assertEqual(len(ids), 5)
+        page = [row[0] async for row in self.db.iter_transactions(after_id=ids[0], limit=3, batch_size=2)]
+        self.assertEqual(page, ids[1:4])
+
+    async def test_concurrent_reads_are_coalesced(self):
+        results = await asyncio.gather(*(self.db.get_product(self.gum_id) for _ in range(50)))
+
+        self.assertTrue(all(result == ("Gum", 0.50) for result in results))
+        self.assertGreater(self.db.coalesced, 0)
+
+    async def test_cancelled_caller_does_not_cancel_coalesced_reads(self):
+        first = asyncio.create_task(self.db.get_products())
+        second = asyncio.create_task(self.db.get_products())
+        await asyncio.sleep(0)
+        first.cancel()
+
+        rows = await second
+        self.assertEqual(rows[0][0], self.gum_id)
+        self.assertTrue(first.cancelled())
+
+        # Coalesced callers get separate result objects
+        results = await asyncio.gather(*(self.db.get_products() for _ in range(3)))
+        results[0].clear()
+        self.assertEqual(len(results[1]), 1)
+
+    async def test_reads_after_a_write_see_it(self):
+        gate = threading.Event()
+
+        def get_product(conn, product_id):
+            gate.wait(5)
+            return milkdb.get_product(conn, product_id)
+
+        # A read still running when the write is made is not joined by reads made after it
+        before = asyncio.create_task(self.db._read(get_product, self.gum_id))
+        await asyncio.sleep(0)
+        await self.db.update_product(self.gum_id, Product(product_name="Gum", price=0.75, quantity=3))
+        after = asyncio.create_task(self.db._read(get_product, self.gum_id))
+        await asyncio.sleep(0)
+        gate.set()
+
+        self.assertEqual(await after, ("Gum", 0.75))
+        await before
+        self.assertEqual(self.db.coalesced, 0)
+
+    async def test_vending_machine(self):
+        machine = AsyncVendingMachine(self.db)
+        self.assertTrue(await machine.load_into("a1", "Gum"))
+        self.assertEqual(await machine.load_planogram({"a2": self.gum_id, "a3": "Mints"}),
+                         {"loaded": ["a2"], "missing": ["Mints"]})
+        self.assertEqual((await machine.get_product("a2")).product_name, "Gum")
+
+        # Concurrent slot changes on one machine are applied one after another, so none is lost
+        await machine.remove_from("a1")
+        await asyncio.gather(machine.load_planogram({"b1": "Gum", "b2": "Gum"}), machine.load_into("a1", "Gum"),
+                             machine.load_planogram({"c1": "Gum"}), machine.load_into("c2", "Gum"))
+        self.assertEqual(list(await machine.list_products()), ["a1", "a2", "b1", "b2", "c1", "c2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import json
+import os
+import sqlite3
+import tempfile
+from model import Product
+from milkdb import setUpDB, create_product, get_products
+from catalog import import_products, export_products
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.conn = setUpDB(sqlite3.connect(':memory:'))
+        create_product(Product(product_name="Pepsi", price=1.50, product_company="PepsiCo", quantity=10), self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_import_csv_upserts(self):
+        path = self.write("catalogue.csv", "product_name,price,product_company,quantity\n"
+                                           "Pepsi,1.75,PepsiCo,12\n"
+                                           "Sprite,1.25,,\n"
+                                           "Broken,not-a-price,,\n")
+
+        result = import_products(self.conn, path, chunk_size=1)
+
+        self.assertEqual(result["imported"], 2)
+        self.assertEqual([line for line, _ in result["errors"]], [4])
+        products = {row[1]: row for row in get_products(self.conn)}
+        self.assertEqual(products["Pepsi"][2:], (1.75, "PepsiCo", 12))
+        self.assertEqual(products["Sprite"][2:], (1.25, "", 0))
+
+    def test_import_partial_catalogue_keeps_other_columns(self):
+        path = self.write("prices.csv", "product_name,price\nPepsi,1.99\nSprite,1.25\n")
+
+        self.assertEqual(import_products(self.conn, path)["imported"], 2)
+
+        products = {row[1]: row for row in get_products(self.conn)}
+        self.assertEqual(products["Pepsi"][2:], (1.99, "PepsiCo", 10))
+        self.assertEqual(products["Sprite"][2:], (1.25, "", 0))
+
+    def test_import_jsonl(self):
+        path = self.write("catalogue.jsonl", json.dumps({"product_name": "Gum", "price": 0.5}) + "\n\n{oops\n")
+
+        result = import_products(self.conn, path)
+
+        self.assertEqual(result["imported"], 1)
+        self.assertEqual([line for line, _ in result["errors"]], [3])
+
+    def test_export_round_trip(self):
+        create_product(Product(product_name="Chips", price=2.00, quantity=4), self.conn)
+        for name in ("export.csv", "export.jsonl"):
+            path = os.path.join(self.tmpdir.name, name)
+            self.assertEqual(export_products(self.conn, path, batch_size=1)["exported"], 2)
+
+            other = setUpDB(sqlite3.connect(':memory:'))
+            self.assertEqual(import_products(other, path)["imported"], 2)
+            self.assertEqual(get_products(other), get_products(self.conn))
+            other.close()
+
+    def test_round_trip_null_company(self):
+        self.conn.execute("INSERT INTO inventory (product_name, price) VALUES ('Water', 1.00)")
+        self.conn.commit()
+        path = os.path.join(self.tmpdir.name, "export.jsonl")
+        export_products(self.conn, path)
+
+        other = setUpDB(sqlite3.connect(':memory:'))
+        result = import_products(other, path)
+        self.assertEqual((result["imported"], result["errors"]), (2, []))
+        self.assertEqual({row[1]: row[3] for row in get_products(other)}, {"Pepsi": "PepsiCo", "Water": ""})
+        other.close()
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            import_products(self.conn, "catalogue.xlsx")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import instrumentation
+from model import Product
+from dbpool import ConnectionManager
+from milkdb import setUpDB, create_product, get_products, order_many, stream_transaction_table, \
+    display_inventory_table, get_orders_between
+
+
+class TestConnectionManager(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, 'pool.db')
+        self.manager = ConnectionManager(self.db_file)
+
+    def tearDown(self):
+        self.manager.close()
+        self.tmpdir.cleanup()
+
+    def test_pragmas_applied(self):
+        self.assertEqual(self.manager.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertEqual(self.manager.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+        self.assertEqual(self.manager.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+
+    def test_custom_pragmas(self):
+        manager = ConnectionManager(self.db_file, pragmas={"journal_mode": None, "busy_timeout": 250})
+        try:
+            self.assertEqual(manager.execute('PRAGMA busy_timeout').fetchone()[0], 250)
+        finally:
+            manager.close()
+
+    def test_one_connection_per_thread(self):
+        main_conn = self.manager.connection()
+        self.assertIs(self.manager.connection(), main_conn)
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.manager.connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], main_conn)
+
+    def test_connections_closed_when_threads_exit(self):
+        self.manager.connection()
+        threads = [threading.Thread(target=self.manager.connection) for _ in range(50)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+
+        self.assertEqual(len(self.manager._connections), 1)
+        self.manager.release()
+        self.assertEqual(len(self.manager._connections), 0)
+
+    def test_milkdb_accepts_manager(self):
+        setUpDB(self.manager)
+        create_product(Product(product_name="Milk", price=1.50, quantity=2), self.manager)
+        product_id = get_products(self.manager)[0][0]
+
+        result = order_many(self.manager, [(product_id, 3)])
+
+        self.assertEqual(result["message"], "Ordered 1 line(s)")
+        self.assertEqual(get_products(self.manager)[0][4], 5)
+
+
+    def test_reader_holds_a_snapshot(self):
+        setUpDB(self.manager)
+        create_product(Product(product_name="Milk", price=1.50), self.manager)
+
+        with self.manager.reader() as snapshot:
+            self.assertIsNot(snapshot, self.manager.connection())
+            create_product(Product(product_name="Juice", price=2.00), self.manager)
+            self.assertEqual(snapshot.execute('SELECT COUNT(*) FROM inventory').fetchone()[0], 1)
+            with self.assertRaises(sqlite3.OperationalError):
+                snapshot.execute("DELETE FROM inventory")
+
+        with self.manager.reader() as snapshot:
+            self.assertEqual(snapshot.execute('SELECT COUNT(*) FROM inventory').fetchone()[0], 2)
+
+    def test_reports_do_not_wait_for_writers(self):
+        setUpDB(self.manager)
+        create_product(Product(product_name="Milk", price=1.50, quantity=10), self.manager)
+        order_many(self.manager, [(get_products(self.manager)[0][0], 1)])
+
+        # Another writer holds the write lock with an uncommitted order
+        writer = sqlite3.connect(self.db_file, timeout=0)
+        writer.execute('BEGIN IMMEDIATE')
+        writer.execute('INSERT INTO orderhistory (product_id, cost, quantity) VALUES (1, 1.50, 1)')
+        try:
+            out = io.StringIO()
+            self.assertEqual(stream_transaction_table(self.manager, out, "csv")["rows"], 1)
+        finally:
+            writer.rollback()
+            writer.close()
+
+    def test_reports_on_reader_are_instrumented(self):
+        setUpDB(self.manager)
+        create_product(Product(product_name="Milk", price=1.50, quantity=10), self.manager)
+        order_many(self.manager, [(get_products(self.manager)[0][0], 1)])
+        instrumentation.reset()
+        instrumentation.enable()
+        try:
+            self.assertEqual(len(get_orders_between(self.manager, '2000-01-01', '2100-01-01')), 1)
+            stats = instrumentation.stats()["milkdb.get_orders_between"]
+        finally:
+            instrumentation.enable(False)
+            instrumentation.reset()
+        self.assertGreaterEqual(stats["statements"], 1)
+        self.assertEqual(stats["rows"], 1)
+
+    def test_report_on_missing_database_returns_error(self):
+        manager = ConnectionManager(os.path.join(self.tmpdir.name, 'missing.db'))
+        try:
+            self.assertTrue(display_inventory_table(manager)["message"].startswith("Error: "))
+        finally:
+            manager.close()
+
+    def test_reader_on_memory_database(self):
+        manager = ConnectionManager(':memory:')
+        try:
+            with manager.reader() as snapshot:
+                self.assertIs(snapshot, manager.connection())
+        finally:
+            manager.close()
+
+if __name__ == '__main__':
+    unittest.main()
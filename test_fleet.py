@@ -0,0 +1,67 @@
+import unittest
+import sqlite3
+from model import Product
+from milkdb import setUpDB, create_product, get_products, update_product, delete_productID
+from fleet import Fleet
+from slotgrid import SlotGrid
+
+
+class TestFleet(unittest.TestCase):
+    def setUp(self):
+        self.conn = setUpDB(sqlite3.connect(':memory:'))
+        create_product(Product(product_name="Pepsi", price=1.50, quantity=10), self.conn)
+        create_product(Product(product_name="Chips", price=2.00, quantity=10), self.conn)
+        self.pepsi_id, self.chips_id = [row[0] for row in get_products(self.conn)]
+        self.fleet = Fleet(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_products_are_shared(self):
+        result = self.fleet.load_planograms({
+            machine_id: {"a1": "Pepsi", "a2": self.chips_id, "a3": "Sprite"} for machine_id in range(100)
+        })
+
+        self.assertEqual(len(result["loaded"]), 100)
+        self.assertEqual(result["missing"], ["Sprite"])
+        self.assertEqual(len(self.fleet.products), 2)
+        self.assertIs(self.fleet.get_product(0, "a1"), self.fleet.get_product(99, "a1"))
+
+    def test_reload_product_everywhere(self):
+        for machine_id in range(3):
+            self.fleet.load_into(machine_id, "a1", "Pepsi")
+        update_product(self.conn, self.pepsi_id, Product(product_name="Pepsi", price=1.75))
+
+        self.assertEqual(self.fleet.reload_product(self.pepsi_id), {"reloaded": 1, "removed": []})
+        self.assertTrue(all(self.fleet.get_product(machine_id, "a1").price == 1.75 for machine_id in range(3)))
+        self.assertEqual(self.fleet.machines_with(self.pepsi_id), [0, 1, 2])
+
+        delete_productID(self.pepsi_id, self.conn)
+        self.assertEqual(self.fleet.reload_products()["removed"], [self.pepsi_id])
+        self.assertIsNone(self.fleet.get_product(0, "a1"))
+
+    def test_unused_products_are_released(self):
+        self.fleet.load_planogram("m1", {"a1": "Pepsi", "a2": "Chips"})
+        self.fleet.load_into("m2", "a1", "Chips")
+
+        self.assertEqual(self.fleet.remove_from("m1", "a1").product_name, "Pepsi")
+        self.assertNotIn(self.pepsi_id, self.fleet.products)
+
+        self.fleet.remove_machine("m1")
+        self.assertIn(self.chips_id, self.fleet.products)
+        self.assertEqual(list(self.fleet.list_products("m2")), ["a1"])
+
+
+    def test_machine_grids(self):
+        self.fleet.add_machine("big", SlotGrid(20, 20))
+        self.fleet.load_planograms({"big": {"t20": "Pepsi", "a1": "Chips"}, "small": {"c3": "Pepsi"}})
+
+        self.assertEqual(len(self.fleet.machines["big"]), 400)
+        self.assertEqual(self.fleet.slots("big"), {"a1": self.chips_id, "t20": self.pepsi_id})
+        self.assertEqual(list(self.fleet.list_products("big")), ["a1", "t20"])
+        self.assertEqual(self.fleet.machines_with(self.pepsi_id), ["big", "small"])
+        with self.assertRaises(ValueError):
+            self.fleet.load_into("small", "t20", "Pepsi")
+
+if __name__ == '__main__':
+    unittest.main()
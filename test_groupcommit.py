@@ -0,0 +1,107 @@
+import unittest
+import os
+import tempfile
+import time
+from model import Product
+from dbpool import ConnectionManager
+from groupcommit import OrderHistoryWriter
+from milkdb import setUpDB, create_product, get_products, order, shutdown_event
+
+
+class TestOrderHistoryWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.conn = setUpDB(ConnectionManager(os.path.join(self.tmpdir.name, 'groupcommit.db')))
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def history_count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM orderhistory').fetchone()[0]
+
+    def test_flushes_when_batch_is_full(self):
+        writer = OrderHistoryWriter(self.conn, max_rows=3, max_delay_ms=60000)
+        try:
+            writer.record(1, 1.00, 1)
+            writer.record(1, 1.00, 1)
+            self.assertEqual(self.history_count(), 0)
+            writer.record(1, 1.00, 1)
+            self.assertEqual(self.history_count(), 3)
+        finally:
+            writer.close()
+
+    def test_flushes_after_delay(self):
+        writer = OrderHistoryWriter(self.conn, max_rows=1000, max_delay_ms=20)
+        try:
+            writer.record(1, 1.00, 1)
+            deadline = time.monotonic() + 5
+            while self.history_count() == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(self.history_count(), 1)
+            self.assertEqual(writer.pending(), 0)
+        finally:
+            writer.close()
+
+    def test_explicit_flush(self):
+        writer = OrderHistoryWriter(self.conn, max_rows=1000, max_delay_ms=60000)
+        try:
+            writer.record(1, 2.00, 2)
+            self.assertEqual(writer.flush(), 1)
+            self.assertEqual(writer.flush(), 0)
+            self.assertEqual(self.history_count(), 1)
+        finally:
+            writer.close()
+
+    def test_flush_failure_does_not_fail_the_order(self):
+        create_product(Product(product_name="Cola", price=1.25, quantity=0), self.conn)
+        product_id = get_products(self.conn)[0][0]
+        writer = OrderHistoryWriter(self.conn, max_rows=1, max_delay_ms=10)
+        try:
+            self.conn.execute('ALTER TABLE orderhistory RENAME TO orderhistory_moved')
+            self.conn.commit()
+
+            # The stock is committed once and the history row waits on the writer, which keeps retrying
+            self.assertEqual(order(self.conn, product_id, 5, writer), {"message": "Ordered 5 Cola(s)"})
+            self.assertEqual(get_products(self.conn)[0][4], 5)
+            deadline = time.monotonic() + 5
+            while writer.last_error is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertIsNotNone(writer.last_error)
+            self.assertEqual(writer.pending(), 1)
+
+            self.conn.execute('ALTER TABLE orderhistory_moved RENAME TO orderhistory')
+            self.conn.commit()
+        finally:
+            writer.close()
+        self.assertEqual(self.history_count(), 1)
+
+        # A closed writer is refused before anything is written
+        self.assertEqual(order(self.conn, product_id, 5, writer), {"message": "Error: OrderHistoryWriter is closed"})
+        self.assertEqual(get_products(self.conn)[0][4], 5)
+
+    def test_shutdown_event_drains_writer(self):
+        create_product(Product(product_name="Cola", price=1.25, quantity=0), self.conn)
+        product_id = get_products(self.conn)[0][0]
+        writer = OrderHistoryWriter(self.conn, max_rows=1000, max_delay_ms=60000)
+
+        order(self.conn, product_id, 4, writer)
+        order(self.conn, product_id, 2, writer)
+        self.assertEqual(self.history_count(), 0)
+        self.assertEqual(get_products(self.conn)[0][4], 6)
+
+        db_file = self.conn.db_file
+        shutdown_event(self.conn, writer)
+
+        check = ConnectionManager(db_file)
+        try:
+            rows = check.execute('SELECT product_id, cost, quantity FROM orderhistory ORDER BY transaction_id').fetchall()
+            self.assertEqual(rows, [(product_id, 5.00, 4), (product_id, 2.50, 2)])
+        finally:
+            check.close()
+        with self.assertRaises(RuntimeError):
+            writer.record(product_id, 1.25, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
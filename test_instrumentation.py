@@ -0,0 +1,79 @@
+import unittest
+import sqlite3
+import instrumentation
+from model import Product
+from milkdb import setUpDB, create_product, get_products, iter_products, order_many
+from vendingapi import VendingMachine
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.conn = setUpDB(sqlite3.connect(':memory:'))
+        instrumentation.reset()
+        instrumentation.enable()
+
+    def tearDown(self):
+        instrumentation.enable(False)
+        instrumentation.reset()
+        self.conn.close()
+
+    def test_counts_calls_statements_and_commits(self):
+        create_product(Product(product_name="Chips", price=1.00), self.conn)
+        create_product(Product(product_name="Dip", price=2.00), self.conn)
+
+        stats = instrumentation.stats()["milkdb.create_product"]
+        self.assertEqual(stats["calls"], 2)
+        self.assertGreaterEqual(stats["rows"], 2)  # two inventory rows, plus the search index writes they trigger
+        self.assertEqual(stats["commits"], 2)
+        self.assertGreaterEqual(stats["statements"], 4)
+        self.assertGreaterEqual(stats["p99_ms"], stats["p50_ms"])
+
+    def test_order_many_commits_once(self):
+        create_product(Product(product_name="Chips", price=1.00), self.conn)
+        product_id = get_products(self.conn)[0][0]
+
+        order_many(self.conn, [(product_id, 1)] * 5)
+
+        stats = instrumentation.stats()["milkdb.order_many"]
+        self.assertEqual(stats["commits"], 1)
+        self.assertEqual(stats["rows"], 15)  # five inventory updates, five history rows and their rollup upserts
+
+    def test_generators_and_methods(self):
+        create_product(Product(product_name="Chips", price=1.00), self.conn)
+        self.assertEqual(len(list(iter_products(self.conn))), 1)
+
+        machine = VendingMachine(connection=self.conn)
+        machine.load_into("a1", "Chips")
+        machine.get_product("a1")
+
+        stats = instrumentation.stats()
+        self.assertEqual(stats["milkdb.iter_products"]["rows"], 1)
+        self.assertEqual(stats["milkdb.iter_products"]["statements"], 2)  # the page with the row, then an empty one
+        self.assertEqual(stats["vendingapi.VendingMachine.load_into"]["calls"], 1)
+        self.assertEqual(stats["vendingapi.VendingMachine.get_product"]["statements"], 0)
+
+    def test_keeps_trace_callback_of_its_own(self):
+        statements = []
+        instrumentation.set_trace_callback(self.conn, statements.append)
+        try:
+            get_products(self.conn)
+            get_products(self.conn)
+        finally:
+            instrumentation.set_trace_callback(self.conn, None)
+
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(instrumentation.stats()["milkdb.get_products"]["statements"], 2)
+
+    def test_disabled_records_nothing(self):
+        instrumentation.enable(False)
+        get_products(self.conn)
+        self.assertEqual(instrumentation.stats(), {})
+
+    def test_reset(self):
+        get_products(self.conn)
+        instrumentation.reset()
+        self.assertEqual(instrumentation.stats(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+from model import Product
+from milkdb import setUpDB, get_products
+from inventorycache import InventoryCache
+
+
+class TestInventoryCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, 'cache.db')
+        self.conn = setUpDB(sqlite3.connect(self.db_file))
+        self.cache = InventoryCache(self.conn, max_size=3)
+        self.cache.create_product(Product(product_name="Tea", price=2.00, quantity=5))
+        self.tea_id = get_products(self.conn)[0][0]
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def test_hits_after_first_read(self):
+        self.cache.invalidate()
+        self.assertEqual(self.cache.get_product(self.tea_id), ("Tea", 2.00))
+        self.assertEqual(self.cache.get_row_by_name("Tea")[0], self.tea_id)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_write_through(self):
+        self.cache.add_quantity("Tea", 3)
+        self.cache.update_product(self.tea_id, Product(product_name="Green Tea", price=2.50))
+        hits = self.cache.hits
+
+        self.assertEqual(self.cache.get_row(self.tea_id), (self.tea_id, "Green Tea", 2.50, "", 8))
+        self.assertIsNone(self.cache.get_row_by_name("Tea"))
+        self.assertEqual(self.cache.hits, hits + 1)
+
+        self.cache.delete_productname("Green Tea")
+        self.assertIsNone(self.cache.get_product(self.tea_id))
+
+    def test_get_products_served_from_memory(self):
+        self.cache.create_product(Product(product_name="Coffee", price=3.00))
+        first = self.cache.get_products()
+        misses = self.cache.misses
+        self.assertEqual(self.cache.get_products(), first)
+        self.assertEqual(self.cache.misses, misses)
+
+    def test_lru_eviction(self):
+        for name in ("A", "B"):
+            self.cache.create_product(Product(product_name=name, price=1.00))
+        self.assertEqual(len(self.cache.get_products()), 3)
+        self.cache.create_product(Product(product_name="C", price=1.00))
+        stats = self.cache.stats()
+        self.assertEqual(stats["size"], 3)
+        self.assertEqual(stats["evictions"], 1)
+
+        # An eviction means the cache no longer holds the whole table
+        self.assertEqual([row[1] for row in self.cache.get_products()], ["Tea", "A", "B", "C"])
+
+        # Tea was least recently used, so it is read from the database again
+        misses = self.cache.misses
+        self.cache.get_product(self.tea_id)
+        self.assertEqual(self.cache.misses, misses + 1)
+
+    def test_detects_writes_from_other_connections(self):
+        self.cache.get_product(self.tea_id)
+        other = sqlite3.connect(self.db_file)
+        other.execute("UPDATE inventory SET price = 9.99 WHERE id = ?", (self.tea_id,))
+        other.commit()
+        other.close()
+
+        self.assertEqual(self.cache.get_product(self.tea_id), ("Tea", 9.99))
+
+    def test_detects_writes_on_same_connection(self):
+        self.cache.get_product(self.tea_id)
+        self.conn.execute("UPDATE inventory SET price = 4.50 WHERE id = ?", (self.tea_id,))
+        self.conn.commit()
+
+        self.assertEqual(self.cache.get_product(self.tea_id), ("Tea", 4.50))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,7 +11,37 @@ from milkdb import (
     delete_productID,
     delete_productname,
     display_inventory_table,
+    stream_inventory_table,
+    stream_transaction_table,
+    order,
+    order_many,
+    void_order,
+    get_orders_between,
+    get_orders_for_product,
+    sales_totals,
+    iter_products,
+    iter_transactions,
+    vend,
+    vend_counters,
+    get_daily_sales,
+    rebuild_sales_daily,
+    reset_vend_counters,
+    set_reorder_threshold,
+    get_most_depleted,
+    get_low_stock,
+    reorder_batches,
+    reprice,
+    inventory_valuation,
+    search_products,
+    setUpDB,
 )
+import io
+import json
+import os
+import tempfile
+import threading
+from dbpool import ConnectionManager
+from datetime import date
 
 class TestDatabase(unittest.TestCase):
     def setUp(self):
@@ -198,6 +228,361 @@ class TestDatabase(unittest.TestCase):
         self.assertTrue("Hersey Bar" in result["table"])
         self.assertTrue("Gatorade" in result["table"])
 
+    def test_stream_tables(self):
+        create_product(Product(product_name="Hersey Bar", price=2.99, quantity=30), self.conn)
+        create_product(Product(product_name="Gatorade", price=3.99, quantity=20), self.conn)
+        product_id = get_products(self.conn)[0][0]
+        order(self.conn, product_id, 2)
+
+        out = io.StringIO()
+        result = stream_inventory_table(self.conn, out)
+        self.assertEqual(result["rows"], 2)
+        lines = out.getvalue().splitlines()
+        self.assertIn("Product Name", lines[0])
+        self.assertEqual(lines[2].index("2.99"), lines[3].index("3.99"))
+
+        out = io.StringIO()
+        self.assertEqual(stream_transaction_table(self.conn, out, "ndjson")["rows"], 1)
+        record = json.loads(out.getvalue())
+        self.assertEqual((record["product_id"], record["quantity"]), (product_id, 2))
+
+    def test_order_many(self):
+        print("\nIn test_order_many...")
+
+        create_product(Product(product_name="Water", price=1.00, quantity=10), self.conn)
+        create_product(Product(product_name="Soda", price=2.50, quantity=0), self.conn)
+        products = get_products(self.conn)
+        water_id, soda_id = products[0][0], products[1][0]
+
+        result = order_many(self.conn, [(water_id, 5), (soda_id, 4), (water_id, 1)])
+
+        # One result per line, in the order given
+        self.assertEqual(result["message"], "Ordered 3 line(s)")
+        self.assertEqual([line["quantity"] for line in result["results"]], [5, 4, 1])
+        self.assertEqual(result["results"][1]["cost"], 10.00)
+
+        self.cursor.execute("SELECT quantity FROM inventory ORDER BY id")
+        self.assertEqual(self.cursor.fetchall(), [(16,), (4,)])
+        self.cursor.execute("SELECT product_id, cost, quantity FROM orderhistory ORDER BY transaction_id")
+        self.assertEqual(self.cursor.fetchall(), [(water_id, 5.00, 5), (soda_id, 10.00, 4), (water_id, 1.00, 1)])
+
+    def test_order_many_rolls_back_on_missing_product(self):
+        print("\nIn test_order_many_rolls_back_on_missing_product...")
+
+        create_product(Product(product_name="Water", price=1.00, quantity=10), self.conn)
+        water_id = get_products(self.conn)[0][0]
+
+        result = order_many(self.conn, [(water_id, 5), (water_id + 100, 1)])
+
+        # Nothing is written when any line fails
+        self.assertEqual(result, {"message": f"Product not found: {water_id + 100}"})
+        self.cursor.execute("SELECT quantity FROM inventory WHERE id = ?", (water_id,))
+        self.assertEqual(self.cursor.fetchone()[0], 10)
+        self.cursor.execute("SELECT COUNT(*) FROM orderhistory")
+        self.assertEqual(self.cursor.fetchone()[0], 0)
+
+    def test_order_and_void_order(self):
+        print("\nIn test_order_and_void_order...")
+
+        create_product(Product(product_name="Juice", price=2.00, quantity=1), self.conn)
+        juice_id = get_products(self.conn)[0][0]
+
+        self.assertEqual(order(self.conn, juice_id, 3), {"message": "Ordered 3 Juice(s)"})
+        self.assertEqual(order(self.conn, juice_id + 100, 3), {"message": "Product not found"})
+
+        self.cursor.execute("SELECT transaction_id FROM orderhistory")
+        transaction_id = self.cursor.fetchone()[0]
+        self.assertEqual(void_order(self.conn, transaction_id), {"message": f"Transaction {transaction_id} voided"})
+        self.assertEqual(void_order(self.conn, transaction_id), {"message": "Transaction not found"})
+
+    def insert_history(self, rows):
+        self.cursor.executemany(
+            "INSERT INTO orderhistory (product_id, transaction_date, cost, quantity) VALUES (?, ?, ?, ?)", rows)
+        self.conn.commit()
+
+    def test_orders_between_and_for_product(self):
+        print("\nIn test_orders_between_and_for_product...")
+        self.insert_history([
+            (1, '2024-01-31 23:59:59', 2.00, 1),
+            (1, '2024-02-01 08:00:00', 4.00, 2),
+            (2, '2024-02-14 12:00:00', 3.00, 1),
+            (1, '2024-03-01 00:00:00', 2.00, 1),
+        ])
+
+        february = get_orders_between(self.conn, date(2024, 2, 1), date(2024, 3, 1))
+        self.assertEqual([row[2] for row in february], ['2024-02-01 08:00:00', '2024-02-14 12:00:00'])
+
+        self.assertEqual(len(get_orders_for_product(self.conn, 1)), 3)
+        since = get_orders_for_product(self.conn, 1, since='2024-02-01')
+        self.assertEqual([row[2] for row in since], ['2024-02-01 08:00:00', '2024-03-01 00:00:00'])
+
+    def test_sales_totals(self):
+        print("\nIn test_sales_totals...")
+        self.insert_history([
+            (1, '2024-02-01 08:00:00', 4.00, 2),
+            (1, '2024-02-02 08:00:00', 2.00, 1),
+            (2, '2024-02-14 12:00:00', 3.00, 1),
+            (2, '2024-03-14 12:00:00', 3.00, 1),
+        ])
+
+        # Bounds inside a day are answered from orderhistory; whole days are covered in TestSalesRollup
+        totals = sales_totals(self.conn, '2024-02-01 00:00:01', '2024-03-01 00:00:01')
+        self.assertEqual(totals, [(1, 3, 6.00), (2, 1, 3.00)])
+
+        totals = sales_totals(self.conn, '2024-02-01 12:00:00', '2024-03-01 00:00:01')
+        self.assertEqual(totals, [(1, 1, 2.00), (2, 1, 3.00)])
+
+    def test_iter_products(self):
+        print("\nIn test_iter_products...")
+        for i in range(7):
+            create_product(Product(product_name=f"Snack {i}", price=1.00, quantity=i), self.conn)
+
+        # Pages smaller than the table still return every row once, in id order
+        self.assertEqual(list(iter_products(self.conn, batch_size=3)), get_products(self.conn))
+
+        views = list(iter_products(self.conn, batch_size=3, as_view=True))
+        self.assertEqual([view.quantity for view in views], list(range(7)))
+        self.assertEqual(views[2].to_product().product_name, "Snack 2")
+
+    def test_iter_transactions(self):
+        print("\nIn test_iter_transactions...")
+        self.insert_history([(1, '2024-01-01 00:00:00', 1.00, 1)] * 10)
+        ids = [row[0] for row in iter_transactions(self.conn, batch_size=4)]
+        self.assertEqual(len(ids), 10)
+
+        # Resume after the fourth row and stop after five more
+        page = list(iter_transactions(self.conn, after_id=ids[3], limit=5, batch_size=2))
+        self.assertEqual([row[0] for row in page], ids[4:9])
+
+    def test_vend(self):
+        print("\nIn test_vend...")
+        create_product(Product(product_name="Candy", price=0.75, quantity=3), self.conn)
+        candy_id = get_products(self.conn)[0][0]
+        reset_vend_counters()
+
+        self.assertEqual(vend(self.conn, candy_id, 2), {"message": "Vended 2 Candy(s)"})
+        self.assertEqual(vend(self.conn, candy_id, 2), {"message": "Insufficient stock"})
+        self.assertEqual(vend(self.conn, candy_id + 100), {"message": "Product not found"})
+        self.assertEqual(vend(self.conn, candy_id, -5), {"message": "Quantity must be at least 1"})
+        self.assertEqual(vend(self.conn, candy_id, 0), {"message": "Quantity must be at least 1"})
+        self.assertEqual(vend(self.conn, candy_id, 1, max_retries=-1), {"message": "max_retries must not be negative"})
+
+        self.cursor.execute("SELECT quantity FROM inventory WHERE id = ?", (candy_id,))
+        self.assertEqual(self.cursor.fetchone()[0], 1)
+        self.cursor.execute("SELECT product_id, cost, quantity FROM orderhistory")
+        self.assertEqual(self.cursor.fetchall(), [(candy_id, 1.50, 2)])
+        counters = vend_counters()
+        self.assertEqual((counters["vends"], counters["insufficient_stock"], counters["not_found"]), (1, 1, 1))
+
+        # A transaction the caller left open is neither committed nor joined
+        self.conn.execute("UPDATE inventory SET price = 1.00 WHERE id = ?", (candy_id,))
+        self.assertEqual(vend(self.conn, candy_id),
+                         {"message": "Error: commit or roll back the open transaction before vending"})
+        self.conn.rollback()
+        self.assertEqual(get_product(self.conn, candy_id), ("Candy", 0.75))
+        self.assertEqual(vend(self.conn, candy_id), {"message": "Vended 1 Candy(s)"})
+
+
+class TestSalesRollup(unittest.TestCase):
+    def setUp(self):
+        self.conn = setUpDB(sqlite3.connect(':memory:'))
+        create_product(Product(product_name="Soda", price=2.00, quantity=100), self.conn)
+        self.soda_id = get_products(self.conn)[0][0]
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_rollup_follows_orders_and_voids(self):
+        order(self.conn, self.soda_id, 3)
+        vend(self.conn, self.soda_id, 2)
+        today = self.conn.execute("SELECT date('now')").fetchone()[0]
+        tomorrow = self.conn.execute("SELECT date('now', '+1 day')").fetchone()[0]
+
+        self.assertEqual(get_daily_sales(self.conn, today, tomorrow), [(self.soda_id, today, 5, 10.00)])
+
+        transaction_id = self.conn.execute("SELECT MIN(transaction_id) FROM orderhistory").fetchone()[0]
+        void_order(self.conn, transaction_id)
+        self.assertEqual(sales_totals(self.conn, today, tomorrow), [(self.soda_id, 2, 4.00)])
+
+        void_order(self.conn, transaction_id + 1)
+        self.assertEqual(get_daily_sales(self.conn, today, tomorrow, self.soda_id), [])
+
+    def test_sales_totals_from_rollup(self):
+        create_product(Product(product_name="Cola", price=3.00), self.conn)
+        cola_id = get_products(self.conn)[1][0]
+        self.conn.executemany("INSERT INTO orderhistory (product_id, transaction_date, cost, quantity) "
+                              "VALUES (?, ?, ?, ?)", [
+                                  (self.soda_id, '2024-02-01 08:00:00', 4.00, 2),
+                                  (self.soda_id, '2024-02-02 08:00:00', 2.00, 1),
+                                  (cola_id, '2024-02-14 12:00:00', 3.00, 1),
+                                  (cola_id, '2024-03-14 12:00:00', 3.00, 1),
+                              ])
+        self.conn.commit()
+
+        # Whole-day bounds are answered from sales_daily, anything finer from orderhistory
+        totals = sales_totals(self.conn, '2024-02-01', '2024-03-01')
+        self.assertEqual(totals, [(self.soda_id, 3, 6.00), (cola_id, 1, 3.00)])
+        totals = sales_totals(self.conn, '2024-02-01 12:00:00', '2024-03-01')
+        self.assertEqual(totals, [(self.soda_id, 1, 2.00), (cola_id, 1, 3.00)])
+
+    def test_rebuild_backfills(self):
+        self.conn.execute("INSERT INTO orderhistory (product_id, transaction_date, cost, quantity) "
+                          "VALUES (?, '2023-05-01 09:00:00', 6.00, 3)", (self.soda_id,))
+        self.conn.execute("DELETE FROM sales_daily")
+        self.conn.commit()
+
+        self.assertEqual(rebuild_sales_daily(self.conn), {"message": "Rebuilt 1 daily sales row(s)"})
+        self.assertEqual(sales_totals(self.conn, '2023-05-01', '2023-05-02'), [(self.soda_id, 3, 6.00)])
+
+
+class TestLowStock(unittest.TestCase):
+    def setUp(self):
+        self.conn = setUpDB(sqlite3.connect(':memory:'))
+        for name, quantity in [("Soda", 2), ("Chips", 9), ("Gum", 0), ("Candy", 50)]:
+            create_product(Product(product_name=name, price=1.00, quantity=quantity), self.conn)
+        self.ids = {row[1]: row[0] for row in get_products(self.conn)}
+        set_reorder_threshold(self.conn, self.ids["Soda"], 5, 20)
+        set_reorder_threshold(self.conn, self.ids["Chips"], 10)
+        set_reorder_threshold(self.conn, self.ids["Gum"], 4)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_low_stock_queries(self):
+        self.assertEqual([row[1] for row in get_low_stock(self.conn)], ["Gum", "Soda", "Chips"])
+        self.assertEqual([row[1] for row in get_most_depleted(self.conn, 2)], ["Gum", "Soda"])
+
+        # Untracked products never show up, and quantity changes are picked up at once
+        add_quantity(self.conn, "Chips", 5)
+        self.assertEqual([row[1] for row in get_low_stock(self.conn)], ["Gum", "Soda"])
+        self.assertEqual(set_reorder_threshold(self.conn, 999, 1)["message"], "Product not found")
+        self.assertEqual(set_reorder_threshold(self.conn, self.ids["Gum"], 5, 1)["message"],
+                         "Restock level must be at least the threshold")
+
+    def test_queries_use_the_margin_index(self):
+        plan = self.conn.execute('EXPLAIN QUERY PLAN SELECT id FROM inventory WHERE reorder_threshold IS NOT NULL '
+                                 'AND quantity - reorder_threshold < 0 ORDER BY quantity - reorder_threshold, id')
+        self.assertIn("idx_inventory_stock_margin", plan.fetchall()[0][3])
+
+    def test_reorder_batches_feed_order_many(self):
+        batches = []
+        for lines in reorder_batches(self.conn, batch_size=2):
+            batches.append(lines)
+            self.assertTrue(order_many(self.conn, lines)["message"].startswith("Ordered"))
+        self.assertEqual(batches, [[(self.ids["Gum"], 4), (self.ids["Soda"], 18)], [(self.ids["Chips"], 1)]])
+        self.assertEqual(get_low_stock(self.conn), [])
+
+
+class TestBulkPricing(unittest.TestCase):
+    def setUp(self):
+        self.conn = setUpDB(sqlite3.connect(':memory:'))
+        self.conn.executemany('INSERT INTO inventory (product_name, price, product_company, quantity) VALUES (?, ?, ?, ?)',
+                              [("Pepsi", 1.50, "PepsiCo", 10), ("Doritos", 2.00, "PepsiCo", 5),
+                               ("Coke", 1.40, "Coca-Cola", 20), ("Gum", 0.50, None, 0)])
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def prices(self):
+        return dict(self.conn.execute('SELECT product_name, price FROM inventory'))
+
+    def test_reprice(self):
+        result = reprice(self.conn, where={"product_company": "PepsiCo"}, pct=10, round_to=0.05)
+        self.assertEqual(result["repriced"], 2)
+        self.assertEqual(self.prices(), {"Pepsi": 1.65, "Doritos": 2.20, "Coke": 1.40, "Gum": 0.50})
+
+        self.assertEqual(reprice(self.conn, where={"product_name": ["Coke", "Gum"]}, pct=-50)["repriced"], 2)
+        self.assertAlmostEqual(self.prices()["Coke"], 0.70)
+        self.assertEqual(reprice(self.conn, where={"product_company": None}, pct=-99, round_to=0.25)["repriced"], 1)
+        self.assertEqual(self.prices()["Gum"], 0.25)
+
+        self.assertEqual(reprice(self.conn, pct=-100)["message"], "A price cut must be less than 100%")
+        with self.assertRaises(ValueError):
+            reprice(self.conn, where={"price; DROP TABLE inventory": 1}, pct=5)
+
+    def test_inventory_valuation(self):
+        self.assertEqual(inventory_valuation(self.conn), [(None, 1, 0, 0.0), ("Coca-Cola", 1, 20, 28.0),
+                                                          ("PepsiCo", 2, 15, 25.0)])
+        self.assertEqual(inventory_valuation(self.conn, None), [(None, 4, 35, 53.0)])
+        with self.assertRaises(ValueError):
+            inventory_valuation(self.conn, "price")
+
+
+class TestProductSearch(unittest.TestCase):
+    def setUp(self):
+        self.conn = setUpDB(sqlite3.connect(':memory:'))
+        for name, company in [("Pepsi Max", "PepsiCo"), ("Diet Pepsi", "PepsiCo"), ("Doritos Nacho", "PepsiCo"),
+                              ("Coca-Cola Zero", "Coca-Cola"), ("Crème Brûlée Bar", None)]:
+            create_product(Product(product_name=name, price=1.00, product_company=company or ''), self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def names(self, query, limit=20):
+        return [row[1] for row in search_products(self.conn, query, limit)]
+
+    def test_prefix_search_and_ranking(self):
+        # A name match outranks products that only match on company
+        self.assertEqual(self.names("peps")[:2], ["Pepsi Max", "Diet Pepsi"])
+        self.assertEqual(len(self.names("peps")), 3)
+        self.assertEqual(self.names("pep ma"), ["Pepsi Max"])
+        self.assertEqual(self.names("creme"), ["Crème Brûlée Bar"])
+        self.assertEqual(self.names("peps", limit=1), ["Pepsi Max"])
+        # FTS5 syntax in the query is searched for as plain words, never parsed
+        self.assertEqual(self.names('zero" *'), ["Coca-Cola Zero"])
+        self.assertEqual(self.names('"zero" OR NEAR('), [])
+        self.assertEqual(self.names("   "), [])
+
+    def test_index_follows_changes(self):
+        pepsi_id = search_products(self.conn, "max")[0][0]
+        update_product(self.conn, pepsi_id, Product(product_name="Mountain Dew", price=1.00))
+        self.assertEqual(self.names("max"), [])
+        self.assertEqual(self.names("mountain"), ["Mountain Dew"])
+
+        delete_productname("Mountain Dew", self.conn)
+        self.assertEqual(self.names("mountain"), [])
+
+    def test_like_fallback_without_fts(self):
+        for name in ["insert", "delete", "update"]:
+            self.conn.execute(f"DROP TRIGGER inventory_search_{name}")
+        self.conn.execute("DROP TABLE inventory_search")
+
+        self.assertEqual(self.names("peps"), ["Pepsi Max", "Diet Pepsi", "Doritos Nacho"])
+        self.assertEqual(self.names("cola zer"), ["Coca-Cola Zero"])
+
+
+class TestConcurrentVend(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        # A short busy timeout so contention is handled by vend's own retries
+        self.manager = setUpDB(ConnectionManager(os.path.join(self.tmpdir.name, 'vend.db'),
+                                                 pragmas={"busy_timeout": 1}))
+        create_product(Product(product_name="Water", price=1.00, quantity=50), self.manager)
+        self.product_id = get_products(self.manager)[0][0]
+
+    def tearDown(self):
+        self.manager.close()
+        self.tmpdir.cleanup()
+
+    def test_never_oversells(self):
+        results = []
+
+        def buyer():
+            for _ in range(20):
+                results.append(vend(self.manager, self.product_id, 1, max_retries=100)["message"])
+
+        threads = [threading.Thread(target=buyer) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count("Vended 1 Water(s)"), 50)
+        self.assertEqual(results.count("Insufficient stock"), 110)
+        self.assertEqual(get_products(self.manager)[0][4], 0)
+        self.assertEqual(self.manager.execute("SELECT COUNT(*) FROM orderhistory").fetchone()[0], 50)
+
 
 if __name__ == '__main__':
     unittest.main()
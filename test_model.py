@@ -1,5 +1,6 @@
 import unittest
-from model import Product
+from model import Product, ProductView
+from slotgrid import DEFAULT_GRID
 
 
 class TestProduct(unittest.TestCase):
@@ -65,7 +66,28 @@ class TestProduct(unittest.TestCase):
         invalid_slot = "d4"
         if invalid_slot not in valid_slots:
             self.assertNotIn(invalid_slot, valid_slots)
-            
+
+    def test_invalid_slot_rejected(self):
+        # Slots belong to a machine's grid, so a Product accepts any code and the grid rejects it
+        self.assertEqual(Product(slot="t20", **self.valid_product).slot, "t20")
+        with self.assertRaises(ValueError):
+            DEFAULT_GRID.index("d4")
+
+    def test_from_row(self):
+        result = Product.from_row((7, "Chocolate Bar", 5.00, None, 1))
+        self.assertEqual(result.product_name, "Chocolate Bar")
+        self.assertEqual(result.price, 5.00)
+        self.assertEqual(result.product_company, "")
+        self.assertEqual(result.quantity, 1)
+        self.assertEqual(result.slot, "")
+
+    def test_product_view(self):
+        view = ProductView._make((7, "Chocolate Bar", 5.00, "Nestle", 1))
+        self.assertEqual(view.product_name, "Chocolate Bar")
+        self.assertEqual(view.to_product(), Product(**self.valid_product))
+        with self.assertRaises(AttributeError):
+            view.price = 1.00
+
 if __name__ == '__main__':
     unittest.main()
     
\ No newline at end of file
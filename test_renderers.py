@@ -0,0 +1,61 @@
+import unittest
+import csv
+import io
+import json
+import sqlite3
+from renderers import RENDERERS, register_renderer, render
+
+
+class TestRenderers(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('CREATE TABLE t (id INTEGER, name TEXT, company TEXT)')
+        self.conn.executemany('INSERT INTO t VALUES (?, ?, ?)',
+                              [(1, 'Gum', None), (2, 'Gatorade', 'Pepsi, Inc.'), (3, 'A much longer name', 'X')])
+
+    def tearDown(self):
+        self.conn.close()
+
+    def cursor(self):
+        return self.conn.execute('SELECT * FROM t ORDER BY id')
+
+    def test_text_sizes_columns_from_sample(self):
+        out = io.StringIO()
+        self.assertEqual(render(self.cursor(), out, sample_size=2), 3)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], 'id  name      company')
+        self.assertEqual(lines[2], '1   Gum')
+        self.assertEqual(lines[3].index('Pepsi'), lines[0].index('company'))
+        # Values wider than the sample are written in full, not truncated
+        self.assertIn('A much longer name', lines[4])
+
+    def test_csv_and_ndjson(self):
+        out = io.StringIO()
+        render(self.cursor(), out, 'csv')
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(rows[0], ['id', 'name', 'company'])
+        self.assertEqual(rows[2], ['2', 'Gatorade', 'Pepsi, Inc.'])
+
+        out = io.StringIO()
+        render(self.cursor(), out, 'ndjson')
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(records[0], {'id': 1, 'name': 'Gum', 'company': None})
+
+    def test_pretty_and_custom_renderers(self):
+        out = io.StringIO()
+        render(self.cursor(), out, 'pretty', columns=['ID', 'Name', 'Company'])
+        self.assertIn('Gatorade', out.getvalue())
+
+        register_renderer('ids', lambda rows, out, columns, sample_size: out.write(
+            ','.join(str(row[0]) for row in rows)))
+        self.addCleanup(RENDERERS.pop, 'ids')
+        out = io.StringIO()
+        render(self.cursor(), out, 'ids')
+        self.assertEqual(out.getvalue(), '1,2,3')
+
+        with self.assertRaises(ValueError):
+            render(self.cursor(), io.StringIO(), 'xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
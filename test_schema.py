@@ -0,0 +1,58 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+from schema import SCHEMA_VERSION, ensure_schema, schema_version
+
+
+class TestSchema(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, 'schema.db')
+        self.conn = sqlite3.connect(self.db_file)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def test_new_database_is_migrated_once(self):
+        self.assertEqual(schema_version(self.conn), 0)
+        self.assertEqual(ensure_schema(self.conn), list(range(1, SCHEMA_VERSION + 1)))
+        self.assertEqual(schema_version(self.conn), SCHEMA_VERSION)
+        self.assertEqual(ensure_schema(self.conn), [])
+
+    def test_pre_versioning_database_is_backfilled(self):
+        # A database made by the old setUpDB: tables but no version and no rollup
+        self.conn.execute('CREATE TABLE inventory (id INTEGER PRIMARY KEY AUTOINCREMENT, product_name TEXT NOT NULL '
+                          'UNIQUE, price REAL NOT NULL, product_company TEXT DEFAULT NULL, quantity INTEGER DEFAULT 0)')
+        self.conn.execute('CREATE TABLE orderhistory (transaction_id INTEGER PRIMARY KEY AUTOINCREMENT, product_id '
+                          'INTEGER, transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP, cost REAL NOT NULL, '
+                          'quantity INTEGER NOT NULL)')
+        self.conn.execute("INSERT INTO orderhistory (product_id, transaction_date, cost, quantity) "
+                          "VALUES (1, '2024-01-01 10:00:00', 3.00, 2)")
+        self.conn.commit()
+
+        ensure_schema(self.conn)
+
+        self.assertEqual(self.conn.execute('SELECT product_id, day, units, revenue FROM sales_daily').fetchall(),
+                         [(1, '2024-01-01', 2, 3.00)])
+
+    def test_reorder_columns_added_once(self):
+        ensure_schema(self.conn)
+        # Pretend the threshold migration never ran although its columns exist
+        self.conn.execute('PRAGMA user_version = 3')
+        self.assertEqual(ensure_schema(self.conn), list(range(4, SCHEMA_VERSION + 1)))
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(inventory)')]
+        self.assertEqual(columns.count('reorder_threshold'), 1)
+
+    def test_version_survives_reopen(self):
+        ensure_schema(self.conn)
+        other = sqlite3.connect(self.db_file)
+        try:
+            self.assertEqual(ensure_schema(other), [])
+        finally:
+            other.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from slotgrid import DEFAULT_GRID, SlotGrid, SlotView
+
+
+class TestSlotGrid(unittest.TestCase):
+    def test_default_grid(self):
+        self.assertEqual(list(DEFAULT_GRID), ["a1", "a2", "a3", "b1", "b2", "b3", "c1", "c2", "c3"])
+        self.assertEqual(DEFAULT_GRID.index("b1"), 3)
+        self.assertEqual(DEFAULT_GRID.code(8), "c3")
+        self.assertNotIn("d4", DEFAULT_GRID)
+        self.assertIsNone(DEFAULT_GRID.lookup("d4"))
+        with self.assertRaises(ValueError):
+            DEFAULT_GRID.index("d4")
+
+    def test_large_grid(self):
+        grid = SlotGrid(30, 12)
+        self.assertEqual(len(grid), 360)
+        self.assertEqual(grid.index("z12"), 25 * 12 + 11)
+        self.assertEqual(grid.code(26 * 12), "aa1")
+        self.assertEqual(grid.codes[-1], "ad12")
+        self.assertEqual([grid.index(code) for code in grid], list(range(360)))
+        with self.assertRaises(ValueError):
+            SlotGrid(0, 4)
+
+    def test_slot_view(self):
+        view = SlotView(DEFAULT_GRID, [0, 7, 0, 0, 0, 0, 0, 0, 9], empty=0)
+        self.assertEqual(view, {"a2": 7, "c3": 9})
+        self.assertEqual(list(view), ["a2", "c3"])
+        self.assertIsNone(view.get("a1"))
+        self.assertIsNone(view.get("z9"))
+
+
+if __name__ == '__main__':
+    unittest.main()
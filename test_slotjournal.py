@@ -0,0 +1,76 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+from model import Product
+from milkdb import setUpDB, create_product, get_products
+from slotgrid import SlotGrid
+from slotjournal import SlotJournal
+from vendingapi import VendingMachine
+
+
+class TestSlotJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'machine-1')
+        self.conn = setUpDB(sqlite3.connect(':memory:'))
+        create_product(Product(product_name="Pepsi", price=1.50, product_company="PepsiCo", quantity=10), self.conn)
+        create_product(Product(product_name="Chips", price=2.00, quantity=4), self.conn)
+        self.chips_id = get_products(self.conn)[1][0]
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def restart(self, **kwargs):
+        # A machine on a connection with no tables: any database read during restore would fail
+        return VendingMachine(connection=sqlite3.connect(':memory:'), journal=SlotJournal(self.path, **kwargs))
+
+    def test_restore_from_journal(self):
+        machine = VendingMachine(connection=self.conn, journal=SlotJournal(self.path))
+        machine.load_planogram({"a1": "Pepsi", "b2": self.chips_id})
+        machine.load_into("c3", "Pepsi")
+        machine.remove_from("a1")
+
+        restored = self.restart()
+        self.assertEqual(restored.list_products(), machine.list_products())
+        self.assertEqual(restored.get_product("c3").product_company, "PepsiCo")
+        self.assertEqual(restored.journal.pending, 4)
+
+    def test_shared_decode_cache(self):
+        VendingMachine(connection=self.conn, journal=SlotJournal(self.path)).load_planogram({"a1": "Pepsi", "a2": "Pepsi"})
+        products = {}
+        first = SlotJournal(self.path, products=products).restore()
+        second = SlotJournal(self.path, products=products).restore()
+        self.assertIs(first[0], second[1])
+        self.assertEqual(len(products), 1)
+
+    def test_snapshots_compact_the_journal(self):
+        machine = VendingMachine(connection=self.conn, journal=SlotJournal(self.path, snapshot_every=3))
+        for slot_name in ["a1", "a2", "a3", "b1"]:
+            machine.load_into(slot_name, "Chips")
+
+        self.assertTrue(os.path.exists(self.path + '.snapshot'))
+        self.assertEqual(machine.journal.pending, 1)
+        self.assertEqual(list(self.restart(snapshot_every=3).list_products()), ["a1", "a2", "a3", "b1"])
+
+    def test_torn_record_is_dropped(self):
+        machine = VendingMachine(connection=self.conn, journal=SlotJournal(self.path))
+        machine.load_into("a1", "Pepsi")
+        machine.load_into("a2", "Chips")
+        with open(self.path + '.journal', 'r+b') as f:
+            f.truncate(os.path.getsize(self.path + '.journal') - 3)
+
+        restored = self.restart()
+        self.assertEqual(list(restored.list_products()), ["a1"])
+        restored.remove_from("a1")
+        self.assertEqual(self.restart().list_products(), {})
+
+    def test_grid_must_match(self):
+        VendingMachine(connection=self.conn, journal=SlotJournal(self.path)).load_into("a1", "Pepsi")
+        with self.assertRaises(ValueError):
+            SlotJournal(self.path, grid=SlotGrid(4, 4)).restore()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import sqlite3
+from model import Product
+from milkdb import setUpDB, create_product, get_products
+from slotgrid import SlotGrid
+from vendingapi import VendingMachine
+
+
+class TestVendingMachine(unittest.TestCase):
+    def setUp(self):
+        self.conn = setUpDB(sqlite3.connect(':memory:'))
+        create_product(Product(product_name="Pepsi", price=1.50, product_company="PepsiCo", quantity=10), self.conn)
+        create_product(Product(product_name="Doritos", price=2.00, quantity=4), self.conn)
+        self.pepsi_id, self.doritos_id = [row[0] for row in get_products(self.conn)]
+        self.machine = VendingMachine(connection=self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_load_into(self):
+        self.assertTrue(self.machine.load_into("a1", "Pepsi"))
+        self.assertTrue(self.machine.load_into("a2", str(self.doritos_id)))
+        self.assertFalse(self.machine.load_into("a3", "Sprite"))
+
+        self.assertEqual(self.machine.get_product("a1").product_company, "PepsiCo")
+        self.assertEqual(self.machine.get_product("a2").product_name, "Doritos")
+        self.assertIsNone(self.machine.get_product("a3"))
+
+    def test_load_planogram(self):
+        self.machine.load_into("c3", "Pepsi")
+        result = self.machine.load_planogram({"a1": "Pepsi", "a2": self.doritos_id, "b1": "Sprite"})
+
+        self.assertEqual(result, {"loaded": ["a1", "a2"], "missing": ["Sprite"]})
+        self.assertEqual(self.machine.get_product("a1").price, 1.50)
+        self.assertEqual(self.machine.get_product("a2").quantity, 4)
+        self.assertIsNone(self.machine.get_product("b1"))
+        self.assertEqual(self.machine.get_product("c3").product_name, "Pepsi")
+
+    def test_remove_from(self):
+        self.machine.load_into("a1", "Pepsi")
+        self.assertEqual(self.machine.remove_from("a1").product_name, "Pepsi")
+        self.assertIsNone(self.machine.remove_from("a1"))
+        self.assertEqual(self.machine.list_products(), {})
+
+
+    def test_slot_grid(self):
+        machine = VendingMachine(connection=self.conn, grid=SlotGrid(10, 20))
+        self.assertEqual(machine.load_planogram({"j20": "Pepsi", "a1": "Doritos"})["loaded"], ["j20", "a1"])
+        self.assertEqual(list(machine.list_products()), ["a1", "j20"])
+        self.assertEqual(machine.slots["j20"].product_name, "Pepsi")
+
+        # Slots outside the grid are rejected on load and read as empty
+        with self.assertRaises(ValueError):
+            machine.load_planogram({"a1": "Pepsi", "k1": "Pepsi"})
+        self.assertEqual(machine.get_product("a1").product_name, "Doritos")
+        self.assertIsNone(machine.get_product("k1"))
+        self.assertIsNone(self.machine.get_product("j20"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,30 +1,127 @@
 from model import Product
 import sqlite3
+from instrumentation import instrumented
+from slotgrid import DEFAULT_GRID, SlotView
+
+RESOLVE_CHUNK_SIZE = 500  # identifiers per IN (...) query, well under SQLite's variable limit
+
+
+def resolve_products(conn, identifiers):
+    # Map each identifier to its inventory row in one query per chunk, matching product_name first and then id.
+    # Names and ids are matched in separate UNION ALL branches so both use their index,
+    # where "product_name = ? OR id = ?" would scan the table
+    identifiers = list(dict.fromkeys(identifiers))
+
+    by_name = {}
+    by_id = {}
+    cursor = conn.cursor()
+    for start in range(0, len(identifiers), RESOLVE_CHUNK_SIZE):
+        chunk = identifiers[start:start + RESOLVE_CHUNK_SIZE]
+        names = [str(identifier) for identifier in chunk]
+        ids = [int(identifier) for identifier in chunk if str(identifier).isdigit()]
+        query = (f"SELECT 0, id, product_name, price, product_company, quantity FROM inventory "
+                 f"WHERE product_name IN ({', '.join('?' * len(names))})")
+        if ids:
+            query += (f" UNION ALL SELECT 1, id, product_name, price, product_company, quantity FROM inventory "
+                      f"WHERE id IN ({', '.join('?' * len(ids))})")
+        cursor.execute(query, names + ids)
+        for matched_id, *row in cursor.fetchall():
+            if matched_id:
+                by_id[row[0]] = tuple(row)
+            else:
+                by_name[row[1]] = tuple(row)
+
+    resolved = {}
+    for identifier in identifiers:
+        row = by_name.get(str(identifier))
+        if row is None and str(identifier).isdigit():
+            row = by_id.get(int(identifier))
+        if row is not None:
+            resolved[identifier] = row
+    return resolved
+
 
 class VendingMachine:
-    def __init__(self, db_file = 'vendingmachine.db'):
-        self.slots = {}  # A dictionary to represent the vending machine slots (slot_name: product)
+    def __init__(self, db_file = 'vendingmachine.db', connection = None, grid = DEFAULT_GRID, journal = None):
+        self.grid = grid  # The slot layout of this machine model (slotgrid.SlotGrid)
+        # An optional slotjournal.SlotJournal: slots are restored from it here, without querying the database,
+        # and every later slot change is appended to it
+        self.journal = journal
+        if journal is not None and journal.grid != grid:
+            raise ValueError(f"The journal is for {journal.grid!r}, not {grid!r}")
+        self._slots = journal.restore() if journal is not None else [None] * len(grid)  # Product or None per slot
         self.db_file = db_file
-        self.connection = sqlite3.connect(db_file)
+        # A shared connection or dbpool.ConnectionManager can be passed in instead of opening a private one
+        self.connection = connection if connection is not None else sqlite3.connect(db_file)
+
+    @property
+    def slots(self):
+        """
+        dict-like view of the filled slots (slot_name: product), in slot order.
+        """
+        return SlotView(self.grid, self._slots)
+
+    def _log(self, mutations):
+        # Append (index, product or None) slot changes to the journal, snapshotting when it has grown enough
+        if self.journal is not None:
+            self.journal.append(mutations)
+            if self.journal.needs_snapshot():
+                self.journal.snapshot(self._slots)
+
+    @instrumented
     def load_into(self, slot_name: str, product_identifier: str):
+            index = self.grid.index(slot_name)  # Raises ValueError for a slot this machine does not have
             # Check if a product with the given name or ID exists in the database
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT * FROM products WHERE product_name = ? OR product_id = ?", (product_identifier, product_identifier))
-            product_data = cursor.fetchone()
-            
+            product_data = self._resolve([product_identifier]).get(product_identifier)
+
             if product_data:
                 # Product found in the database, create a Product object and load it into the slot
-                product = Product(product_id=product_data[0],
-                    product_name=product_data[1],
-                    price=product_data[2],
-                    quantity=product_data[3],
-                    product_company=product_data[4]
-                )
-                self.slots[slot_name] = product
+                self._slots[index] = Product.from_row(product_data)
+                self._log([(index, self._slots[index])])
                 return True  # Product loaded successfully
-            
+
             return False  # Product not found in the database
 
+    @instrumented
+    def load_planogram(self, planogram: dict):
+        """
+        Load many slots at once, resolving every product with a single query.
+
+        Args:
+            planogram (dict): Maps slot names to product names or IDs (e.g., {"a1": "Pepsi", "a2": 7}).
+
+        Returns:
+            dict: "loaded" lists the slots that were filled and "missing" lists the identifiers
+                that matched no product. Slots whose product is missing are left untouched.
+
+        Raises:
+            ValueError: If a slot name is not in this machine's grid; nothing is loaded.
+        """
+        indexes = {slot_name: self.grid.index(slot_name) for slot_name in planogram}
+        found = self._resolve(planogram.values())
+
+        slots = list(self._slots)
+        loaded = []
+        missing = []
+        changes = []
+        for slot_name, product_identifier in planogram.items():
+            product_data = found.get(product_identifier)
+            if product_data is None:
+                missing.append(product_identifier)
+            else:
+                slots[indexes[slot_name]] = Product.from_row(product_data)
+                loaded.append(slot_name)
+                changes.append((indexes[slot_name], slots[indexes[slot_name]]))
+
+        # Swap in a new array so readers never see a half-applied planogram
+        self._slots = slots
+        self._log(changes)
+        return {"loaded": loaded, "missing": missing}
+
+    def _resolve(self, identifiers):
+        return resolve_products(self.connection, identifiers)
+
+    @instrumented
     def remove_from(self, slot_name: str):
         """
         Remove a product from a slot in the vending machine.
@@ -35,8 +132,16 @@ class VendingMachine:
         Returns:
             Product or None: The removed product, or None if the slot is empty.
         """
-        return self.slots.pop(slot_name, None)
+        index = self.grid.lookup(slot_name)
+        if index is None:
+            return None
+        product = self._slots[index]
+        if product is not None:
+            self._slots[index] = None
+            self._log([(index, None)])
+        return product
 
+    @instrumented
     def get_product(self, slot_name: str):
         """
         Get the product information from a slot in the vending machine.
@@ -47,13 +152,16 @@ class VendingMachine:
         Returns:
             Product or None: The product in the slot, or None if the slot is empty.
         """
-        return self.slots.get(slot_name)
+        index = self.grid.lookup(slot_name)
+        return None if index is None else self._slots[index]
 
+    @instrumented
     def list_products(self):
         """
         List all products in the vending machine.
         
         Returns:
-            dict: A dictionary representing the vending machine slots and their products.
+            dict: A dictionary representing the vending machine slots and their products, in slot order.
         """
-        return self.slots
\ No newline at end of file
+        codes = self.grid.codes
+        return {codes[index]: product for index, product in enumerate(self._slots) if product is not None}
\ No newline at end of file